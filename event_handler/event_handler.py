@@ -1,12 +1,17 @@
 from .events import CargoShip, CH47, Vendor, VendingMachine, PatrolHelicopter, Crate, OilRigEvent
-from typing import List, Union, Optional
-from rustWplus import RustSocket, RustError, RustMarker, RustMonument
+from .utils import find_nearest_harbor_cords
+from .utils.coords import GRID_DIAMETER
+from typing import Optional
+from rustWplus import RustSocket, RustError, RustMonument
 from collections import defaultdict
 import asyncio
 import logging
+import math
 import time
 
 OPENING_TIME = 900
+# Cargo this close to a harbor is about to dock, so markers are polled faster
+HARBOR_APPROACH_DISTANCE = GRID_DIAMETER * 3
 class Marker:
     PlayerMarker = 1
     ExplosionMarker = 2
@@ -46,17 +51,19 @@ class EventHandler:
         self.last_heartbeat = time.time() - 60
 
         await self.init_monuments()
+        self.socket.marker_watcher.activity = self.is_active
 
-        while self.socket.ws.connection.open:
+        async for diff in self.socket.watch_markers():
             try:
-
                 now = time.time()
 
-                markers: Union[List[RustMarker], RustError] = await self.socket.get_markers()
                 if now - self.last_heartbeat >= 60:
+                    stats = self.socket.marker_watcher.stats
                     self.logger.info(
                         f"Polling active | "
                         f"tracked VM: {len(self.vending_machines)} | "
+                        f"mode: {stats['mode']}, {stats['poll_rate'] * 60:.0f} polls/min, "
+                        f"{stats['tokens_per_minute']:.0f} tokens/min | "
                         f"{time.strftime('%H:%M:%S')}"
                     )
 
@@ -64,40 +71,50 @@ class EventHandler:
 
                     self.logger.debug("Markers response received")
 
-                if isinstance(markers, RustError):
-                    self.logger.warning("Catch RustError, trying to get markers again")
-                    await asyncio.sleep(1)
-                    continue
-                
-                marker_by_id = {m.id: m for m in markers}
-
+                marker_by_id = diff.markers
 
                 if self.just_start:
                     self.logger.info("Skipping old markers")
                     self.just_start = False
-                    active_ids = {m.id for m in marker_by_id.values() if m.type == Marker.VendingMachineMarker}
-                    for id in active_ids:
-                        if id not in self.vending_machines:
-                            m = marker_by_id[id]
+                    for m in diff.by_type(Marker.VendingMachineMarker):
+                        if m.id not in self.vending_machines:
                             self.logger.info(f"[NOT SHOWN] Added VendingMachine ({m.id}, {m.x}, {m.y})")
-                            self.vending_machines[id] = VendingMachine(data=m, socket=self.socket, map_size=self.map_size)
-
-                await self.handle_vendor(marker_by_id)
-                await self.handle_cargo(marker_by_id)
-                await self.handle_patrol_heli(marker_by_id)
-                await self.handle_crate(marker_by_id)
-
-                await self.handle_ch47(marker_by_id)
-                await self.handle_vending_machines(marker_by_id)
+                            self.vending_machines[m.id] = VendingMachine(data=m, socket=self.socket, map_size=self.map_size)
+
+                # Only markers of these types appeared, vanished or moved since the last poll
+                changed = diff.changed_types
+
+                if Marker.TravelingVendor in changed:
+                    await self.handle_vendor(marker_by_id)
+                if Marker.CargoShipMarker in changed:
+                    await self.handle_cargo(marker_by_id)
+                if Marker.PatrolHelicopterMarker in changed:
+                    await self.handle_patrol_heli(marker_by_id)
+                if Marker.CrateMarker in changed:
+                    await self.handle_crate(marker_by_id)
+
+                if Marker.ChinookMarker in changed:
+                    await self.handle_ch47(marker_by_id)
+                if Marker.VendingMachineMarker in changed:
+                    await self.handle_vending_machines(marker_by_id)
                 
             except asyncio.CancelledError:
                 self.logger.warning("EventHandler cancelled")
                 raise
             except Exception as e:
                 self.logger.exception(f"EventHandler crashed: {e}")
-                await asyncio.sleep(2)
-            
-            await asyncio.sleep(3)
+
+    def is_active(self, marker_by_id) -> bool:
+        for m in marker_by_id.values():
+            if m.type in (Marker.PatrolHelicopterMarker, Marker.ChinookMarker):
+                return True
+
+            if m.type == Marker.CargoShipMarker and any("harbor" in token for token in self.monuments):
+                harbor_x, harbor_y = find_nearest_harbor_cords((m.x, m.y), self.monuments)
+                if math.hypot(m.x - harbor_x, m.y - harbor_y) <= HARBOR_APPROACH_DISTANCE:
+                    return True
+
+        return False
 
     # ----------------- SINGLE EVENTS -----------------
     async def handle_vendor(self, marker_by_id):
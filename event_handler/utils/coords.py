@@ -1,16 +1,14 @@
 from typing import Tuple, Optional
-import string
 from math import sqrt
 import logging
 
+from rustWplus.utils.utils import GRID_LABELS
+
 GRID_DIAMETER = 146.28571428571428
 OIL_HELI_MAX_DISTANCE = GRID_DIAMETER * 4
 
 def convert_coordinates_to_grid(coords: Tuple[int, int], map_size: int) -> Tuple[str, int]:
-    grids = list(string.ascii_uppercase)
-    grids.extend(a+b for a in string.ascii_uppercase for b in string.ascii_uppercase)
-
-    return grids[int(coords[0] // GRID_DIAMETER)], int ((map_size - coords[1]) // GRID_DIAMETER)
+    return GRID_LABELS[int(coords[0] // GRID_DIAMETER)], int ((map_size - coords[1]) // GRID_DIAMETER)
 
 def convert_coordinates_to_map_side(coords: Tuple[int, int], map_size: int) -> str:
     x = coords[0]
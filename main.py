@@ -6,7 +6,7 @@ import time
 from rustWplus import (
     RustSocket, CommandOptions, Command, RustServer, ChatCommand,
     FCMListener, RateLimiter, RustServerInfo, Emoji, format_time_simple, 
-    RustError
+    RustError, ConnectionEvent, ConnectionEventPayload, Priority, use_consumer
 )
 from rustWplus.constants import BOOT_FILE, FCM_FILE
 from spy import TrackedPlayer, TrackedList
@@ -16,9 +16,8 @@ from event_handler import EventHandler
 
 
 async def hang_bot(socket: RustSocket) -> None:
-    while socket.ws.connection.open:
-
-        await asyncio.sleep(1)
+    # RustSocket reconnects by itself, this only returns once it gives up
+    await socket.ws.wait_closed()
 
 async def prepare_spying(tracking_list: TrackedList, logger: logging.Logger) -> None:
     logger.info("Preparing spy functional")
@@ -58,23 +57,32 @@ async def run_bot(socket: RustSocket, tracking: TrackedList, server_details: Rus
         status_msg = "joined" if online else "left"
         message = f"{player.nickname} {status_msg}"
         try:
-            await socket.send_team_message(f"{Emoji.EXCLAMATION}{message}")
+            with use_consumer("spy"):
+                await socket.send_team_message(f"{Emoji.EXCLAMATION}{message}", priority=Priority.LOW)
         except RustError:
             logger.warning("Failed to send spy info")
 
     tracking._on_status_change = on_status_change
 
+    # Commands always get a token a second, marker polling outweighs spy notifications
+    socket.ratelimiter.set_consumer("commands", weight=3, minimum=1)
+    socket.ratelimiter.set_consumer("events", weight=2)
+    socket.ratelimiter.set_consumer("spy", weight=1)
+
     # ------------------- Health Check -------------------
+    # Liveness comes from websocket ping/pong, so this costs no rate limit tokens
     async def bot_health_check():
         while True:
             await asyncio.sleep(60)
 
-            result = await socket.get_time()
-
-            if isinstance(result, RustError):
+            stats = socket.ws.heartbeat_stats
+            if not socket.ws.connection or stats["rtt_last"] is None:
                 logger.warning(f"[HEALTH CHECK] Server did not respond")
             else:
-                logger.info(f"[HEALTH CHECK] Server OK at {time.strftime('%H:%M:%S')}")
+                logger.info(
+                    f"[HEALTH CHECK] Server OK at {time.strftime('%H:%M:%S')} "
+                    f"(rtt {stats['rtt_last'] * 1000:.0f}ms, missed {stats['missed']})"
+                )
 
     health_task = asyncio.create_task(bot_health_check())
 
@@ -83,7 +91,12 @@ async def run_bot(socket: RustSocket, tracking: TrackedList, server_details: Rus
     serv: RustServerInfo = await socket.get_info()
     map_size = serv.map_size
     event_handler = EventHandler(socket=socket, map_size=map_size)
-    event_task = asyncio.create_task(event_handler.start())
+    with use_consumer("events"):
+        event_task = asyncio.create_task(event_handler.start())
+
+    @ConnectionEvent(server_details)
+    async def on_connection(event: ConnectionEventPayload):
+        logger.info(f"[CONNECTION] {event.state} (attempt {event.attempt})")
 
     try:
 
@@ -263,6 +276,9 @@ async def run_bot(socket: RustSocket, tracking: TrackedList, server_details: Rus
         await hang_bot(socket=socket)
     
     finally:
+        # Every pass of the reconnect loop registers a new listener, drop this one
+        ConnectionEventPayload.HANDLER_LIST.unregister(on_connection, server_details)
+
         # Отменяем health check при завершении работы бота
         health_task.cancel()
         event_task.cancel()
@@ -1,9 +1,12 @@
 from .rust_api import RustSocket
+from .constants import set_data_dir
 from .identification import RustServer
-from .annotations import Command, ChatEvent, ProtobufEvent, TeamEvent, EntityEvent
+from .annotations import Command, ChatEvent, ProtobufEvent, TeamEvent, EntityEvent, ConnectionEvent
 from .gateway.fcm import FCMListener
-from .gateway.ratelimiter import RateLimiter
+from .gateway.ratelimiter import RateLimiter, Reservation, SharedBucketStore, use_consumer
+from .gateway.websocket import Priority
 from .commands import CommandOptions, ChatCommand
-from .events import ChatEventPayload, TeamEventPayload, EntityEventPayload
+from .events import ChatEventPayload, TeamEventPayload, EntityEventPayload, ProtobufEventPayload, ConnectionEventPayload
+from .state import TeamChange, MarkerDiff, MarkerWatcher
 from .utils import convert_event_type_to_name, Emoji, convert_coordinates_to_grid, format_time_simple
 from .rust_models import RustError, RustMarker, RustServerInfo, RustTime, RustMonument
\ No newline at end of file
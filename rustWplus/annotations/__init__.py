@@ -2,4 +2,5 @@ from .command import Command
 from .entity_event import EntityEvent
 from .chat_event import ChatEvent
 from .team_event import TeamEvent
-from .protobuf_event import ProtobufEvent
\ No newline at end of file
+from .protobuf_event import ProtobufEvent
+from .connection_event import ConnectionEvent
\ No newline at end of file
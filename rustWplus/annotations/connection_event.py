@@ -0,0 +1,17 @@
+from typing import Callable
+
+from .. import RustServer
+from ..identification import RegisteredListener
+from ..events import ConnectionEventPayload as ConnectionEventManager
+
+def ConnectionEvent(server_details: RustServer) -> Callable:
+    def wrapper(func) -> RegisteredListener:
+        if isinstance(func, RegisteredListener):
+            func = func.get_coro()
+
+        listener = RegisteredListener(func.__name__, func)
+        ConnectionEventManager.HANDLER_LIST.register(listener, server_details)
+
+        return listener
+
+    return wrapper
\ No newline at end of file
@@ -1,4 +1,13 @@
 from .constants import (
     BOOT_FILE,
-    FCM_FILE
+    FCM_FILE,
+    PROXY_FILE,
+    RATELIMIT_FILE,
+    SHARED_RATELIMIT_FILE,
+    MAP_CACHE_DIR,
+    GRID_CACHE_DIR,
+    DATA_DIR_ENV,
+    get_data_dir,
+    set_data_dir,
+    data_path
 )
\ No newline at end of file
@@ -1,2 +1,44 @@
+import os
+import sys
+from typing import Union
+
 FCM_FILE = "rustWplus/resources/config/fcm.json"
-BOOT_FILE = "rustWplus/resources/config/boot.json"
\ No newline at end of file
+BOOT_FILE = "rustWplus/resources/config/boot.json"
+
+# Files the library writes at runtime (caches, learned values) are named relative
+# to the data directory, see data_path
+DATA_DIR_ENV = "RUSTWPLUS_DATA_DIR"
+PROXY_FILE = "proxy.json"
+RATELIMIT_FILE = "ratelimits.json"
+SHARED_RATELIMIT_FILE = "ratelimits.shm"
+MAP_CACHE_DIR = "maps"
+GRID_CACHE_DIR = "grids"
+
+_data_dir: Union[str, None] = None
+
+
+def _default_data_dir() -> str:
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "rustWplus")
+
+
+def get_data_dir() -> str:
+    """
+    The directory runtime files are kept in: set_data_dir, else the
+    RUSTWPLUS_DATA_DIR environment variable, else the user's cache directory
+    """
+    return _data_dir or os.environ.get(DATA_DIR_ENV) or _default_data_dir()
+
+
+def set_data_dir(path: Union[str, None]) -> None:
+    global _data_dir
+    _data_dir = os.path.abspath(path) if path is not None else None
+
+
+def data_path(name: str) -> str:
+    return os.path.join(get_data_dir(), name)
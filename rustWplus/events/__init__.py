@@ -1,4 +1,5 @@
 from .chat_event import ChatEventPayload
 from .entity_event import EntityEventPayload
 from .team_event import TeamEventPayload
-from .protobuf_event import ProtobufEventPayload
\ No newline at end of file
+from .protobuf_event import ProtobufEventPayload
+from .connection_event import ConnectionEventPayload
\ No newline at end of file
@@ -0,0 +1,33 @@
+from typing import Union
+from rustWplus.identification.handler_list import HandlerList
+
+class ConnectionEventPayload:
+    HANDLER_LIST = HandlerList()
+
+    CONNECTED = "connected"
+    DISCONNECTED = "disconnected"
+    RECONNECTING = "reconnecting"
+    RECONNECTED = "reconnected"
+    FAILED = "failed"
+
+    def __init__(self, state: str, attempt: int = 0, delay: float = 0, reason: Union[str, None] = None) -> None:
+        self._state = state
+        self._attempt = attempt
+        self._delay = delay
+        self._reason = reason
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def attempt(self) -> int:
+        return self._attempt
+
+    @property
+    def delay(self) -> float:
+        return self._delay
+
+    @property
+    def reason(self) -> Union[str, None]:
+        return self._reason
\ No newline at end of file
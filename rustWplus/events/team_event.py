@@ -1,12 +1,16 @@
+from typing import List, Union
+
 from rustWplus.identification.handler_list import HandlerList
 from ..rust_models import RustTeamInfo
+from ..state import TeamChange
 
 class TeamEventPayload:
     HANDLER_LIST = HandlerList()
 
-    def __init__(self, player_id: int, team_info: RustTeamInfo) -> None:
+    def __init__(self, player_id: int, team_info: RustTeamInfo, changes: Union[List[TeamChange], None] = None) -> None:
         self._player_id = player_id
         self._team_info = team_info
+        self._changes = changes or []
 
     @property
     def player_id(self) -> int:
@@ -14,4 +18,11 @@ class TeamEventPayload:
     
     @property
     def team_info(self) -> RustTeamInfo:
-        return self._team_info
\ No newline at end of file
+        return self._team_info
+
+    @property
+    def changes(self) -> List[TeamChange]:
+        """
+        What changed since the previous team snapshot, empty for the first one
+        """
+        return self._changes
\ No newline at end of file
@@ -1,31 +1,154 @@
-import requests
+import aiohttp
+import asyncio
+import json
+import os
 import time
 import logging
+from typing import Any, Set, Union
+
+from ...constants import PROXY_FILE, data_path
 
 
 class ProxyValueGrabber:
 
+    URL = "https://companion-rust.facepunch.com/api/version"
+    TTL = 600
+    REQUEST_TIMEOUT = 3
+    RETRY_DELAY = 30
+    FALLBACK = 9999999999999
+
     VALUE = -1
     LAST_FETCHED = -1
+    LAST_ATTEMPT = -1
+    REFRESH_TASK: Union[asyncio.Task, None] = None
+    SESSION: Union[aiohttp.ClientSession, None] = None
+    # Sockets using the value; the refresh task and session live while there are any
+    USERS: Set[Any] = set()
 
     @staticmethod
-    def get_value() -> int:
-        if (
-            ProxyValueGrabber.VALUE != 1
+    async def get_value(user: Any = None) -> int:
+        """
+        Returns the last known value straight away and refreshes it in the
+        background. Only the very first call, with nothing cached or persisted,
+        waits for the version endpoint. A user passed here keeps the refresh
+        running until it calls release
+        """
+        if user is not None:
+            ProxyValueGrabber.USERS.add(user)
+
+        if ProxyValueGrabber.VALUE == -1:
+            ProxyValueGrabber.load()
+
+        if ProxyValueGrabber.VALUE == -1 and ProxyValueGrabber.LAST_ATTEMPT == -1:
+            await ProxyValueGrabber.fetch()
+
+        ProxyValueGrabber.start_background_refresh()
+
+        if ProxyValueGrabber.VALUE == -1:
+            logging.getLogger("rustWplus").warning("Failed to get value from Rust+ server")
+            return ProxyValueGrabber.FALLBACK
+
+        return ProxyValueGrabber.VALUE
+
+    @staticmethod
+    def is_fresh() -> bool:
+        return (
+            ProxyValueGrabber.VALUE != -1
             and
-            ProxyValueGrabber.LAST_FETCHED >= time.time() - 600
-        ):
-            return ProxyValueGrabber.VALUE
-        
-        data = requests.get("https://companion-rust.facepunch.com/api/version")
-
-        if data.status_code == 200:
-            publish_time = data.json().get("minPublishedTime", None)
-            if publish_time is not None:
-                ProxyValueGrabber.VALUE = publish_time
-                ProxyValueGrabber.LAST_FETCHED = time.time()
-                return ProxyValueGrabber.VALUE
-            
-        logging.getLogger("rustWplus").warning("Failed to get value from Rust+ server")
-
-        return 9999999999999
\ No newline at end of file
+            ProxyValueGrabber.LAST_FETCHED >= time.time() - ProxyValueGrabber.TTL
+        )
+
+    @staticmethod
+    async def fetch() -> bool:
+        ProxyValueGrabber.LAST_ATTEMPT = time.time()
+        try:
+            async with ProxyValueGrabber.session().get(ProxyValueGrabber.URL) as resp:
+                if resp.status != 200:
+                    return False
+                data = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logging.getLogger("rustWplus").warning(f"Failed to fetch proxy value: {e}")
+            return False
+
+        publish_time = data.get("minPublishedTime", None)
+        if publish_time is None:
+            return False
+
+        ProxyValueGrabber.VALUE = publish_time
+        ProxyValueGrabber.LAST_FETCHED = time.time()
+        ProxyValueGrabber.save()
+        return True
+
+    @staticmethod
+    def session() -> aiohttp.ClientSession:
+        if ProxyValueGrabber.SESSION is None or ProxyValueGrabber.SESSION.closed:
+            timeout = aiohttp.ClientTimeout(total=ProxyValueGrabber.REQUEST_TIMEOUT)
+            ProxyValueGrabber.SESSION = aiohttp.ClientSession(timeout=timeout)
+        return ProxyValueGrabber.SESSION
+
+    @staticmethod
+    async def release(user: Any) -> None:
+        """
+        Called by a socket that no longer needs the value. The last one to
+        leave stops the refresh task and closes the session
+        """
+        ProxyValueGrabber.USERS.discard(user)
+        if not ProxyValueGrabber.USERS:
+            await ProxyValueGrabber.close()
+
+    @staticmethod
+    async def close() -> None:
+        task, ProxyValueGrabber.REFRESH_TASK = ProxyValueGrabber.REFRESH_TASK, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        session, ProxyValueGrabber.SESSION = ProxyValueGrabber.SESSION, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    @staticmethod
+    def start_background_refresh() -> None:
+        task = ProxyValueGrabber.REFRESH_TASK
+        if task is not None and not task.done():
+            return
+
+        ProxyValueGrabber.REFRESH_TASK = asyncio.create_task(
+            ProxyValueGrabber._refresh_loop(), name="[RustWPlus.py] Proxy Value Refresh Task"
+        )
+
+    @staticmethod
+    async def _refresh_loop() -> None:
+        while True:
+            if (
+                not ProxyValueGrabber.is_fresh()
+                and
+                ProxyValueGrabber.LAST_ATTEMPT < time.time() - ProxyValueGrabber.RETRY_DELAY
+            ):
+                await ProxyValueGrabber.fetch()
+
+            if ProxyValueGrabber.is_fresh():
+                delay = ProxyValueGrabber.LAST_FETCHED + ProxyValueGrabber.TTL - time.time()
+            else:
+                delay = ProxyValueGrabber.RETRY_DELAY
+            await asyncio.sleep(max(delay, 1))
+
+    @staticmethod
+    def load() -> None:
+        try:
+            with open(data_path(PROXY_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            ProxyValueGrabber.VALUE = data["value"]
+            ProxyValueGrabber.LAST_FETCHED = data.get("fetched", -1)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def save() -> None:
+        try:
+            path = data_path(PROXY_FILE)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"value": ProxyValueGrabber.VALUE, "fetched": ProxyValueGrabber.LAST_FETCHED}, f)
+        except OSError as e:
+            logging.getLogger("rustWplus").warning(f"Failed to persist proxy value: {e}")
\ No newline at end of file
@@ -1 +1,4 @@
-from .ratelimiter import TokenBucket, RateLimiter
\ No newline at end of file
+from .ratelimiter import TokenBucket, RateLimiter
+from .fair_queue import use_consumer
+from .reservation import Reservation, current_reservation
+from .shared import SharedBucketStore
\ No newline at end of file
@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import itertools
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, Tuple, Union
+
+DEFAULT_CONSUMER = "default"
+
+# Token grants are attributed to the consumer set for the current task,
+# e.g. everything a chat command requests is charged to "commands"
+current_consumer: ContextVar[str] = ContextVar("rustwplus_consumer", default=DEFAULT_CONSUMER)
+
+
+@contextlib.contextmanager
+def use_consumer(name: str) -> Iterator[None]:
+    token = current_consumer.set(name)
+    try:
+        yield
+    finally:
+        current_consumer.reset(token)
+
+
+class ConsumerPolicy:
+    # Credit is capped so an idle consumer cannot bank an unbounded burst,
+    # but can always save up for the most expensive request (get_map)
+    MIN_CREDIT_CAP = 5
+
+    def __init__(self, weight: float = 1, minimum: float = 0) -> None:
+        if weight <= 0:
+            raise ValueError("Consumer weight must be positive")
+        if minimum < 0:
+            raise ValueError("Consumer minimum must not be negative")
+
+        self.weight = weight
+        self.minimum = minimum
+        self.credit_cap = max(minimum, self.MIN_CREDIT_CAP)
+
+
+class ConsumerStats:
+    def __init__(self) -> None:
+        self.granted: int = 0
+        self.tokens: int = 0
+        self.waiting: int = 0
+        self.total_wait: float = 0
+        self.max_wait: float = 0
+
+    def record(self, amount: int, waited: float) -> None:
+        self.granted += 1
+        self.tokens += amount
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def serialize(self) -> Dict[str, Union[int, float]]:
+        return {
+            "granted": self.granted,
+            "tokens": self.tokens,
+            "waiting": self.waiting,
+            "avg_wait": self.total_wait / self.granted if self.granted else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class Waiter:
+    __slots__ = ("consumer", "amount", "future", "start", "finish", "order", "queued_at")
+
+    def __init__(self, consumer: str, amount: int, future: asyncio.Future, start: float, finish: float, order: int) -> None:
+        self.consumer = consumer
+        self.amount = amount
+        self.future = future
+        self.start = start
+        self.finish = finish
+        self.order = order
+        self.queued_at = time.monotonic()
+
+
+class FairQueue:
+    """
+    Weighted fair queue of token waiters for one server. Each consumer is FIFO
+    internally; between consumers the head with the smallest virtual finish
+    tag goes first, except that a consumer still owed its minimum rate is
+    served ahead of the others
+    """
+
+    def __init__(self, policies: Dict[str, ConsumerPolicy], stats: Dict[str, ConsumerStats]) -> None:
+        self.policies = policies
+        self.stats = stats
+        self.queues: Dict[str, Deque[Waiter]] = {}
+        self.last_finish: Dict[str, float] = {}
+        self.credits: Dict[str, float] = {}
+        self.credit_updated: Dict[str, float] = {}
+        self.virtual_time: float = 0
+        self._order = itertools.count()
+
+    def policy(self, consumer: str) -> ConsumerPolicy:
+        policy = self.policies.get(consumer)
+        if policy is None:
+            policy = self.policies[consumer] = ConsumerPolicy()
+        return policy
+
+    def _tag(self, consumer: str, amount: int) -> Tuple[float, float]:
+        start = max(self.virtual_time, self.last_finish.get(consumer, 0))
+        finish = start + amount / self.policy(consumer).weight
+        self.last_finish[consumer] = finish
+        return start, finish
+
+    def _credit(self, consumer: str) -> float:
+        policy = self.policy(consumer)
+        if policy.minimum <= 0:
+            return 0
+
+        now = time.monotonic()
+        last = self.credit_updated.get(consumer, now)
+        credit = min(self.credits.get(consumer, policy.credit_cap) + (now - last) * policy.minimum, policy.credit_cap)
+        self.credits[consumer] = credit
+        self.credit_updated[consumer] = now
+        return credit
+
+    def _charge(self, consumer: str, amount: int, start: float, waited: float) -> None:
+        self.virtual_time = max(self.virtual_time, start)
+        if self.policy(consumer).minimum > 0:
+            self.credits[consumer] = max(0, self._credit(consumer) - amount)
+
+        self.stats.setdefault(consumer, ConsumerStats()).record(amount, waited)
+
+    def grant_now(self, consumer: str, amount: int) -> None:
+        start, _ = self._tag(consumer, amount)
+        self._charge(consumer, amount, start, 0)
+
+    def push(self, consumer: str, amount: int, future: asyncio.Future) -> Waiter:
+        start, finish = self._tag(consumer, amount)
+        waiter = Waiter(consumer, amount, future, start, finish, next(self._order))
+
+        self.queues.setdefault(consumer, deque()).append(waiter)
+        self.stats.setdefault(consumer, ConsumerStats()).waiting += 1
+        return waiter
+
+    def remove(self, waiter: Waiter) -> None:
+        queue = self.queues.get(waiter.consumer)
+        if queue is None:
+            return
+
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        self.stats[waiter.consumer].waiting -= 1
+
+    def select(self) -> Union[Waiter, None]:
+        heads = []
+        for queue in self.queues.values():
+            while queue and queue[0].future.done():
+                self.stats[queue[0].consumer].waiting -= 1
+                queue.popleft()
+            if queue:
+                heads.append(queue[0])
+
+        if not heads:
+            return None
+
+        guaranteed = [waiter for waiter in heads if self._credit(waiter.consumer) >= waiter.amount]
+        return min(guaranteed or heads, key=lambda waiter: (waiter.finish, waiter.order))
+
+    def grant(self, waiter: Waiter) -> None:
+        self.queues[waiter.consumer].popleft()
+        self.stats[waiter.consumer].waiting -= 1
+        self._charge(waiter.consumer, waiter.amount, waiter.start, time.monotonic() - waiter.queued_at)
+
+    def drain(self) -> Iterator[Waiter]:
+        for queue in self.queues.values():
+            while queue:
+                waiter = queue.popleft()
+                self.stats[waiter.consumer].waiting -= 1
+                yield waiter
+
+    @property
+    def tokens(self) -> int:
+        return sum(waiter.amount for queue in self.queues.values() for waiter in queue if not waiter.future.done())
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
@@ -1,18 +1,30 @@
+import contextlib
+import json
+import logging
 import math
+import os
 import time
 import asyncio
-from typing import Dict
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, List, Tuple, Union
 
+from .fair_queue import ConsumerPolicy, ConsumerStats, FairQueue, current_consumer
+from .reservation import Reservation
+from ...constants import RATELIMIT_FILE, data_path
 from ...exceptions.exceptions import RateLimitError
 from ...identification import RustServer
 
+if TYPE_CHECKING:
+    from .shared import SharedBucketStore
+
 class TokenBucket:
+    clock = staticmethod(time.monotonic)
+
     def __init__(self, current: float, maximum: float, refresh_rate: float, refresh_amount: float) -> None:
         self.current = current
         self.max = maximum
         self.refresh_rate = refresh_rate
         self.refresh_amount = refresh_amount
-        self.last_update = time.time()
+        self.last_update = self.clock()
         self.refresh_per_second = self.refresh_amount / self.refresh_rate
     
     def can_consume(self, amount) -> bool:
@@ -21,8 +33,21 @@ class TokenBucket:
     def consume(self, amount: int = 1) -> None:
         self.current -= amount
 
+    def resize(self, maximum: float, refresh_per_second: float) -> None:
+        self.refresh()
+        self.max = maximum
+        self.refresh_per_second = refresh_per_second
+        self.refresh_amount = refresh_per_second * self.refresh_rate
+        self.current = min(self.current, maximum)
+
+    def serialize(self) -> Dict[str, float]:
+        return {"max": self.max, "refill": self.refresh_per_second}
+
+    def time_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.current) / self.refresh_per_second)
+
     def refresh(self) -> None:
-        time_now = time.time()
+        time_now = self.clock()
         time_delta = time_now - self.last_update
         self.last_update = time_now
         self.current = min(self.current + time_delta * self.refresh_per_second, self.max)
@@ -35,6 +60,18 @@ class RateLimiter:
     SOCKET_LIMIT = 25
     SOCKET_REFRESH_AMOUNT = 3
 
+    # The limits above are only a starting guess. A rate limit error halves the
+    # modelled buckets, and every PROBE_INTERVAL without one adds back a slice
+    # of the defaults until they are reached again
+    RATE_LIMIT_ERRORS = {"rate_limit"}
+    DECREASE_FACTOR = 0.5
+    INCREASE_STEP = 0.1
+    PROBE_INTERVAL = 30
+    # Rejections of requests already in flight when the limits were cut
+    DECREASE_HOLDOFF = 2
+    MIN_LIMIT = 5 # the most expensive request must still fit
+    MIN_REFILL = 0.5
+
     @classmethod
     def default(cls) -> "RateLimiter":
         """
@@ -42,42 +79,289 @@ class RateLimiter:
         """
         return cls()
     
-    def __init__(self) -> None:
+    def __init__(self, shared: Union["SharedBucketStore", None] = None, limits_file: Union[str, None] = None) -> None:
+        """
+        Pass a SharedBucketStore to share the buckets with every other local
+        process using the same store file. Learned limits are kept in
+        limits_file, by default RATELIMIT_FILE in the data directory
+        """
+        self.shared = shared
+        self.limits_file: Union[str, None] = limits_file
         self.socket_bucket: Dict[RustServer, TokenBucket] = {}
         self.server_bucket: Dict[RustServer, TokenBucket] = {}
         self.lock = asyncio.Lock()
+        self.waiters: Dict[RustServer, FairQueue] = {}
+        self.wakeups: Dict[RustServer, asyncio.TimerHandle] = {}
+        self.consumers: Dict[str, ConsumerPolicy] = {}
+        self.consumer_totals: Dict[str, ConsumerStats] = {}
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+        self.last_decrease: Dict[RustServer, float] = {}
+        self.last_probe: Dict[RustServer, float] = {}
+        self.rejections: Dict[RustServer, int] = {}
 
     
+    def _new_bucket(self, key: str, limit: float, refresh_amount: float) -> TokenBucket:
+        if self.shared is None:
+            return TokenBucket(limit, limit, self.REFRESH_RATE, refresh_amount)
+        return self.shared.bucket(key, limit, limit, self.REFRESH_RATE, refresh_amount)
+
+    def _locked(self) -> ContextManager[None]:
+        return self.shared.locked() if self.shared is not None else contextlib.nullcontext()
+
     def add_socket(self, server_details: RustServer) -> None:
-        self.socket_bucket[server_details] = TokenBucket(self.SOCKET_LIMIT, self.SOCKET_LIMIT, self.REFRESH_RATE, self.SOCKET_REFRESH_AMOUNT)
-        self.server_bucket[server_details] = TokenBucket(self.SERVER_LIMIT, self.SERVER_LIMIT, self.REFRESH_RATE, self.SERVER_REFRESH_AMOUNT)
+        server = server_details.get_server_string()
+        self.socket_bucket[server_details] = self._new_bucket(f"socket:{server}:{server_details.player_id}", self.SOCKET_LIMIT, self.SOCKET_REFRESH_AMOUNT)
+        self.server_bucket[server_details] = self._new_bucket(f"server:{server}", self.SERVER_LIMIT, self.SERVER_REFRESH_AMOUNT)
+        self.waiters.setdefault(server_details, FairQueue(self.consumers, self.consumer_totals))
+        self.rejections.setdefault(server_details, 0)
 
+        learned = self.load_limits().get(server)
+        if learned:
+            with self._locked():
+                for bucket, (maximum, refill), name in zip(self._buckets(server_details), self._defaults(), ("socket", "server")):
+                    limit = learned.get(name, {})
+                    bucket.resize(
+                        min(max(limit.get("max", maximum), self.MIN_LIMIT), maximum),
+                        min(max(limit.get("refill", refill), self.MIN_REFILL), refill),
+                    )
+            self.last_probe[server_details] = time.monotonic()
+            self.logger.info(f"Loaded learned rate limits for {server}: {self.get_limits(server_details)}")
 
-    async def can_consume(self, server_details: RustServer, amount: int = 1) -> bool:
-        async with self.lock:
-            for bucket in [
-                self.socket_bucket.get(server_details), 
-                self.server_bucket.get(server_details)
-            ]:
+    def set_consumer(self, name: str, weight: float = 1, minimum: float = 0) -> None:
+        """
+        Configures how a named consumer shares tokens with the others waiting on
+        the same server. Backlogged consumers get tokens in proportion to their
+        weight, and one with a minimum is served first while it has received
+        less than that many tokens per second
+        """
+        self.consumers[name] = ConsumerPolicy(weight, minimum)
+
+    @property
+    def consumer_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.serialize() for name, stats in self.consumer_totals.items()}
+
+    def _buckets(self, server_details: RustServer) -> List[TokenBucket]:
+        return [self.socket_bucket.get(server_details), self.server_bucket.get(server_details)]
+
+    def _defaults(self) -> List[Tuple[float, float]]:
+        return [
+            (self.SOCKET_LIMIT, self.SOCKET_REFRESH_AMOUNT / self.REFRESH_RATE),
+            (self.SERVER_LIMIT, self.SERVER_REFRESH_AMOUNT / self.REFRESH_RATE),
+        ]
+
+    def available(self, server_details: RustServer) -> float:
+        """
+        Share of tokens left in the emptiest bucket, from 0 to 1
+        """
+        with self._locked():
+            buckets = self._buckets(server_details)
+            for bucket in buckets:
+                bucket.refresh()
+            return min(max(bucket.current, 0) / bucket.max for bucket in buckets)
+
+    def get_limits(self, server_details: RustServer) -> Dict[str, Any]:
+        socket_bucket, server_bucket = self._buckets(server_details)
+        return {
+            "socket": socket_bucket.serialize(),
+            "server": server_bucket.serialize(),
+            "rejections": self.rejections.get(server_details, 0),
+        }
+
+    def on_rate_limited(self, server_details: RustServer) -> None:
+        """
+        Called when the server rejects a request for exceeding its rate limit.
+        Empties and shrinks the modelled buckets so queued waiters back off
+        """
+        if server_details not in self.socket_bucket:
+            return
+
+        self.rejections[server_details] += 1
+        now = time.monotonic()
+        if now - self.last_decrease.get(server_details, -self.DECREASE_HOLDOFF) < self.DECREASE_HOLDOFF:
+            return
+
+        with self._locked():
+            for bucket in self._buckets(server_details):
+                bucket.resize(
+                    max(bucket.max * self.DECREASE_FACTOR, self.MIN_LIMIT),
+                    max(bucket.refresh_per_second * self.DECREASE_FACTOR, self.MIN_REFILL),
+                )
+                bucket.current = 0
+
+        self.last_decrease[server_details] = now
+        self.last_probe[server_details] = now
+        self.logger.warning(f"Rate limited by {server_details.get_server_string()}, limits lowered to {self.get_limits(server_details)}")
+        self.save_limits(server_details)
+        self._schedule(server_details)
+
+    def _probe(self, server_details: RustServer) -> None:
+        last = self.last_probe.get(server_details)
+        now = time.monotonic()
+        if last is None or now - last < self.PROBE_INTERVAL:
+            return
+
+        self.last_probe[server_details] = now
+        recovered = True
+        with self._locked():
+            for bucket, (maximum, refill) in zip(self._buckets(server_details), self._defaults()):
+                bucket.resize(
+                    min(bucket.max + maximum * self.INCREASE_STEP, maximum),
+                    min(bucket.refresh_per_second + refill * self.INCREASE_STEP, refill),
+                )
+                recovered = recovered and bucket.max >= maximum and bucket.refresh_per_second >= refill
+
+        if recovered:
+            del self.last_probe[server_details]
+            self.logger.info(f"Rate limits for {server_details.get_server_string()} back to defaults")
+        self.save_limits(server_details)
+
+    @property
+    def limits_path(self) -> str:
+        return self.limits_file or data_path(RATELIMIT_FILE)
+
+    def load_limits(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.limits_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_limits(self, server_details: RustServer) -> None:
+        limits = self.load_limits()
+        key = server_details.get_server_string()
+        socket_bucket, server_bucket = self._buckets(server_details)
+
+        if self.last_probe.get(server_details) is None:
+            # Back at the defaults, nothing worth remembering
+            limits.pop(key, None)
+        else:
+            limits[key] = {
+                "socket": socket_bucket.serialize(),
+                "server": server_bucket.serialize(),
+                "updated": time.time(),
+            }
+
+        try:
+            path = self.limits_path
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(limits, f)
+        except OSError as e:
+            self.logger.warning(f"Failed to persist rate limits: {e}")
+
+    def _try_consume(self, server_details: RustServer, amount: int) -> bool:
+        buckets = self._buckets(server_details)
+        with self._locked():
+            for bucket in buckets:
                 bucket.refresh()
                 if not bucket.can_consume(amount):
                     return False
-            
+
+            for bucket in buckets:
+                bucket.consume(amount)
+            return True
+
+    async def acquire(self, server_details: RustServer, amount: int = 1, consumer: Union[str, None] = None) -> None:
+        """
+        Waits until the tokens are available and consumes them. Each consumer is
+        served first come first served, so a 5 token request cannot be starved
+        by a stream of cheaper ones, and consumers share the server by weight
+        """
+        buckets = self._buckets(server_details)
+        if any(bucket.max < amount for bucket in buckets):
+            raise RateLimitError(f"{amount} tokens can never be available at once")
+
+        self._probe(server_details)
+        consumer = consumer or current_consumer.get()
+        queue = self.waiters[server_details]
+        if not len(queue) and self._try_consume(server_details, amount):
+            queue.grant_now(consumer, amount)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = queue.push(consumer, amount, future)
+        # The new waiter may have an earlier finish tag than the current head
+        self._schedule(server_details)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled, hand the tokens back
+                self._refund(server_details, amount)
+            else:
+                queue.remove(waiter)
+                self._schedule(server_details)
+            raise
+
+    def reserve(self, server_details: RustServer, amount: int, consumer: Union[str, None] = None) -> Reservation:
+        """
+        Returns a reservation of amount tokens, acquired when entered with
+        ``async with``. Check ``eta`` first to see how long that will take
+        """
+        return Reservation(self, server_details, amount, consumer)
+
+    def estimate(self, server_details: RustServer, amount: int) -> float:
+        queued = self.waiters[server_details].tokens
+        with self._locked():
+            for bucket in self._buckets(server_details):
+                bucket.refresh()
+            return max(bucket.time_until(queued + amount) for bucket in self._buckets(server_details))
+
+    def release(self, server_details: RustServer, amount: int) -> None:
+        """
+        Hands back tokens that were acquired but not spent
+        """
+        self._refund(server_details, amount)
+        self._schedule(server_details)
+
+    def _refund(self, server_details: RustServer, amount: int) -> None:
+        with self._locked():
+            for bucket in self._buckets(server_details):
+                bucket.refresh()
+                bucket.current = min(bucket.current + amount, bucket.max)
+
+    def _schedule(self, server_details: RustServer) -> None:
+        # Grants waiters in fair order while the buckets allow, then sleeps until
+        # the refill makes the next selected waiter eligible
+        handle = self.wakeups.pop(server_details, None)
+        if handle is not None:
+            handle.cancel()
+
+        queue = self.waiters.get(server_details)
+        if queue is None:
+            return
+
+        while True:
+            waiter = queue.select()
+            if waiter is None:
+                return
+
+            if not self._try_consume(server_details, waiter.amount):
+                delay = max(bucket.time_until(waiter.amount) for bucket in self._buckets(server_details))
+                self.wakeups[server_details] = asyncio.get_running_loop().call_later(
+                    delay, self._schedule, server_details
+                )
+                return
+
+            queue.grant(waiter)
+            waiter.future.set_result(None)
+
+
+    async def can_consume(self, server_details: RustServer, amount: int = 1) -> bool:
+        async with self.lock:
+            with self._locked():
+                for bucket in self._buckets(server_details):
+                    bucket.refresh()
+                    if not bucket.can_consume(amount):
+                        return False
+
             return True
         
     async def consume(self, server_details: RustServer, amount: int = 1) -> None:
         async with self.lock:
-            for bucket in [
-                self.socket_bucket.get(server_details), self.server_bucket.get(server_details)
-            ]:
-                bucket.refresh()
-                if not bucket.can_consume(amount):
-                    raise RateLimitError("Not enough tokens")
-            
-            for bucket in [
-                self.socket_bucket.get(server_details), self.server_bucket.get(server_details)
-            ]:
-                bucket.consume(amount)
+            if not self._try_consume(server_details, amount):
+                raise RateLimitError("Not enough tokens")
 
     async def get_estimated_delay_time(self, server_details: RustServer, event_cost: int) -> float:
         async with self.lock:
@@ -96,4 +380,17 @@ class RateLimiter:
 
         async with self.lock:
             del self.socket_bucket[server_details]
-            del self.server_bucket[server_details]
\ No newline at end of file
+            del self.server_bucket[server_details]
+            self.last_decrease.pop(server_details, None)
+            self.last_probe.pop(server_details, None)
+            self.rejections.pop(server_details, None)
+
+            handle = self.wakeups.pop(server_details, None)
+            if handle is not None:
+                handle.cancel()
+
+            queue = self.waiters.pop(server_details, None)
+            if queue is not None:
+                for waiter in queue.drain():
+                    if not waiter.future.done():
+                        waiter.future.set_exception(RateLimitError("Socket removed from the rate limiter"))
\ No newline at end of file
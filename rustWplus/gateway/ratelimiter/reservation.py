@@ -0,0 +1,78 @@
+import math
+from contextvars import ContextVar, Token
+from typing import TYPE_CHECKING, Union
+
+from ...identification import RustServer
+
+if TYPE_CHECKING:
+    from .ratelimiter import RateLimiter
+
+
+class Reservation:
+    """
+    Tokens acquired up front for a batch of requests. Inside ``async with``,
+    requests for the same server draw from the reservation instead of queueing,
+    and whatever is left is handed back on exit
+    """
+
+    def __init__(self, limiter: "RateLimiter", server_details: RustServer, amount: int, consumer: Union[str, None] = None) -> None:
+        if amount <= 0:
+            raise ValueError("Reservation amount must be positive")
+
+        self.limiter = limiter
+        self.server_details = server_details
+        self.amount = amount
+        self.consumer = consumer
+        self.acquired: int = 0
+        self.used: int = 0
+        self._token: Union[Token, None] = None
+
+    @property
+    def eta(self) -> float:
+        """
+        Estimated seconds until the whole reservation is granted, given the
+        current bucket levels and the tokens already queued ahead of it
+        """
+        if self.acquired >= self.amount:
+            return 0.0
+        return self.limiter.estimate(self.server_details, self.amount - self.acquired)
+
+    @property
+    def remaining(self) -> int:
+        return self.acquired - self.used
+
+    def take(self, server_details: RustServer, amount: int) -> bool:
+        if server_details != self.server_details or self.remaining < amount:
+            return False
+
+        self.used += amount
+        return True
+
+    async def __aenter__(self) -> "Reservation":
+        # Reservations bigger than a bucket are collected in bucket sized chunks
+        chunk = math.floor(min(bucket.max for bucket in self.limiter._buckets(self.server_details)))
+        try:
+            while self.acquired < self.amount:
+                amount = min(chunk, self.amount - self.acquired)
+                await self.limiter.acquire(self.server_details, amount, self.consumer)
+                self.acquired += amount
+        except BaseException:
+            self._release()
+            raise
+
+        self._token = current_reservation.set(self)
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        if self._token is not None:
+            current_reservation.reset(self._token)
+            self._token = None
+        self._release()
+
+    def _release(self) -> None:
+        if self.remaining > 0 and self.server_details in self.limiter.socket_bucket:
+            self.limiter.release(self.server_details, self.remaining)
+        self.acquired = self.used
+
+
+current_reservation: ContextVar[Union[Reservation, None]] = ContextVar("rustwplus_reservation", default=None)
@@ -0,0 +1,132 @@
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .ratelimiter import TokenBucket
+from ...constants import SHARED_RATELIMIT_FILE, data_path
+
+
+class SharedBucketStore:
+    """
+    Token buckets kept in a memory mapped file, so every local process using
+    the same file draws from the same buckets. Updates are serialised with an
+    advisory flock on the file, no coordinator process is needed
+    """
+
+    MAGIC = b"RWPL"
+    VERSION = 1
+    SLOTS = 128
+
+    HEADER = struct.Struct("<4sII")
+    # key digest, current, max, refill per second, last update (wall clock)
+    SLOT = struct.Struct("<20s4d")
+
+    def __init__(self, path: Union[str, None] = None, slots: Union[int, None] = None) -> None:
+        if fcntl is None:
+            raise RuntimeError("SharedBucketStore needs fcntl, which this platform does not have")
+
+        self.path: str = path or data_path(SHARED_RATELIMIT_FILE)
+        self.slots: int = slots or self.SLOTS
+        self.size: int = self.HEADER.size + self.SLOT.size * self.slots
+        self.index: Dict[bytes, int] = {}
+        self._depth: int = 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.fd: int = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        with self.locked():
+            if os.fstat(self.fd).st_size < self.size:
+                os.ftruncate(self.fd, self.size)
+            self.map = mmap.mmap(self.fd, self.size)
+
+            magic, version, slots = self.HEADER.unpack_from(self.map, 0)
+            if magic != self.MAGIC:
+                self.HEADER.pack_into(self.map, 0, self.MAGIC, self.VERSION, self.slots)
+            elif version != self.VERSION or slots != self.slots:
+                raise ValueError(f"{self.path} was created with a different layout")
+
+    @contextlib.contextmanager
+    def locked(self) -> Iterator[None]:
+        # Reentrant within the process, flock itself would be released by the inner exit
+        if self._depth == 0:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def bucket(self, key: str, current: float, maximum: float, refresh_rate: float, refresh_amount: float) -> "SharedTokenBucket":
+        """
+        Returns the shared bucket for the key, creating it with the given state
+        if no process has yet
+        """
+        digest = hashlib.sha1(key.encode()).digest()
+
+        with self.locked():
+            offset = self._find(digest)
+            if offset is None:
+                offset = self._find(bytes(20))
+                if offset is None:
+                    raise RuntimeError(f"{self.path} has no free bucket slots left")
+                self.SLOT.pack_into(self.map, offset, digest, current, maximum, refresh_amount / refresh_rate, time.time())
+
+        return SharedTokenBucket(self, offset, refresh_rate)
+
+    def _find(self, digest: bytes) -> Union[int, None]:
+        if digest in self.index:
+            return self.index[digest]
+
+        for slot in range(self.slots):
+            offset = self.HEADER.size + slot * self.SLOT.size
+            if self.map[offset:offset + 20] == digest:
+                if any(digest):
+                    self.index[digest] = offset
+                return offset
+        return None
+
+    def close(self) -> None:
+        self.map.close()
+        os.close(self.fd)
+
+
+class SharedTokenBucket(TokenBucket):
+    # Wall clock rather than monotonic, as the state outlives the process
+    clock = staticmethod(time.time)
+
+    CURRENT, MAX, REFILL, LAST_UPDATE = (20 + 8 * field for field in range(4))
+
+    def __init__(self, store: SharedBucketStore, offset: int, refresh_rate: float) -> None:
+        self.store = store
+        self.offset = offset
+        self.refresh_rate = refresh_rate
+
+    def _read(self, field: int) -> float:
+        return struct.unpack_from("<d", self.store.map, self.offset + field)[0]
+
+    def _write(self, field: int, value: float) -> None:
+        struct.pack_into("<d", self.store.map, self.offset + field, value)
+
+    current = property(lambda self: self._read(self.CURRENT), lambda self, value: self._write(self.CURRENT, value))
+    max = property(lambda self: self._read(self.MAX), lambda self, value: self._write(self.MAX, value))
+    refresh_per_second = property(lambda self: self._read(self.REFILL), lambda self, value: self._write(self.REFILL, value))
+    last_update = property(lambda self: self._read(self.LAST_UPDATE), lambda self, value: self._write(self.LAST_UPDATE, value))
+
+    @property
+    def refresh_amount(self) -> float:
+        return self.refresh_per_second * self.refresh_rate
+
+    @refresh_amount.setter
+    def refresh_amount(self, value: float) -> None:
+        self.refresh_per_second = value / self.refresh_rate
@@ -1 +1,2 @@
-from .ws import RustWebSocket
\ No newline at end of file
+from .ws import RustWebSocket
+from .outbound import Priority, use_priority
\ No newline at end of file
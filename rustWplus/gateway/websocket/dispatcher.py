@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, Union
+
+
+class MessageDispatcher:
+    """
+    Hands items to the handler with one serial queue per key. Items sharing a
+    key are handled in order, different keys run concurrently, at most
+    `workers` handlers at a time. Once queue_size items are waiting, put
+    waits for room and drops the item if there is still none after put_timeout
+    """
+
+    WORKERS = 8
+    QUEUE_SIZE = 512
+    PUT_TIMEOUT = 5
+
+    def __init__(
+            self,
+            handler: Callable[[Any], Awaitable[None]],
+            workers: Union[int, None] = None,
+            queue_size: Union[int, None] = None,
+            put_timeout: Union[float, None] = None,
+            on_drop: Union[Callable[[Hashable, Any], None], None] = None,
+    ) -> None:
+        self.handler = handler
+        self.workers: int = max(1, workers or self.WORKERS)
+        self.queue_size: int = max(1, queue_size or self.QUEUE_SIZE)
+        self.put_timeout: float = self.PUT_TIMEOUT if put_timeout is None else put_timeout
+        # Called with every dropped item, so state it would have updated can be invalidated
+        self.on_drop = on_drop
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+
+        self.running: bool = False
+        self.queues: Dict[Hashable, Deque[Any]] = {}
+        self.tasks: Dict[Hashable, asyncio.Task] = {}
+        self._slots: Union[asyncio.Semaphore, None] = None
+        self._room: Union[asyncio.Event, None] = None
+        self.depth: int = 0
+        self.dispatched: int = 0
+        self.blocked: int = 0
+        self.dropped: int = 0
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        self.running = True
+        self._slots = asyncio.Semaphore(self.workers)
+        self._room = asyncio.Event()
+
+    async def stop(self) -> None:
+        self.running = False
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.tasks = {}
+        self.queues = {}
+        self.depth = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Holds one of the worker slots, for work started from a handler that
+        runs on its own, e.g. chat commands
+        """
+        if self._slots is None:
+            yield
+            return
+
+        async with self._slots:
+            yield
+
+    async def put(self, key: Hashable, item: Any) -> bool:
+        if not self.running:
+            return False
+
+        if self.depth >= self.queue_size:
+            self.blocked += 1
+            try:
+                await asyncio.wait_for(self._wait_for_room(), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                self.logger.warning(f"Dispatch queue full, dropped message for key {key}")
+                if self.on_drop is not None:
+                    self.on_drop(key, item)
+                return False
+
+        self.queues.setdefault(key, deque()).append(item)
+        self.depth += 1
+        self.dispatched += 1
+
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.create_task(self._drain(key), name=f"[RustWPlus.py] Dispatch {key}")
+        return True
+
+    async def _wait_for_room(self) -> None:
+        while self.depth >= self.queue_size:
+            self._room.clear()
+            await self._room.wait()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "keys": len(self.tasks),
+            "depth": self.depth,
+            "max_depth": self.queue_size,
+            "dispatched": self.dispatched,
+            "blocked": self.blocked,
+            "dropped": self.dropped,
+        }
+
+    async def _drain(self, key: Hashable) -> None:
+        queue = self.queues[key]
+        try:
+            while queue:
+                async with self.slot():
+                    item = queue.popleft()
+                    self.depth -= 1
+                    self._room.set()
+                    try:
+                        await self.handler(item)
+                    except Exception as e:
+                        self.logger.exception(f"An Error occurred whilst dispatching the message from the server: {e}")
+        finally:
+            # Nothing is awaited between the last popleft and here, so no item can be stranded
+            if self.tasks.get(key) is asyncio.current_task():
+                del self.tasks[key]
+                self.queues.pop(key, None)
@@ -0,0 +1,151 @@
+import dataclasses
+from typing import Iterator, Tuple, Union
+
+import betterproto
+
+from ..rustplus_proto import AppMessage
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_FIXED32 = 5
+
+# AppMessage / AppResponse / AppBroadcast field numbers from rustplus.proto
+MESSAGE_RESPONSE = 1
+MESSAGE_BROADCAST = 2
+RESPONSE_SEQ = 1
+RESPONSE_ERROR = 5
+BROADCAST_TEAM_CHANGED = 4
+BROADCAST_TEAM_MESSAGE = 5
+BROADCAST_ENTITY_CHANGED = 6
+ENTITY_CHANGED_ENTITY_ID = 1
+
+
+class FrameKind:
+    UNKNOWN = 0
+    RESPONSE = 1
+    TEAM_CHANGED = 2
+    TEAM_MESSAGE = 3
+    ENTITY_CHANGED = 4
+    OTHER_BROADCAST = 5
+
+
+@dataclasses.dataclass
+class FrameInfo:
+    kind: int = FrameKind.UNKNOWN
+    seq: int = 0
+    entity_id: int = 0
+    is_error: bool = False
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError("Varint too long")
+
+
+def _iter_fields(data: bytes, pos: int, end: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yields (field_number, wire_type, value_start, value_end). For varints the
+    decoded value is returned in place of value_start
+    """
+    while pos < end:
+        tag, pos = _read_varint(data, pos)
+        field, wire_type = tag >> 3, tag & 0x07
+
+        if wire_type == WIRE_VARINT:
+            value, pos = _read_varint(data, pos)
+            yield field, wire_type, value, pos
+        elif wire_type == WIRE_LENGTH:
+            length, pos = _read_varint(data, pos)
+            if pos + length > end:
+                raise ValueError("Truncated field")
+            yield field, wire_type, pos, pos + length
+            pos += length
+        elif wire_type == WIRE_FIXED64:
+            yield field, wire_type, pos, pos + 8
+            pos += 8
+        elif wire_type == WIRE_FIXED32:
+            yield field, wire_type, pos, pos + 4
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+
+
+def _classify_response(data: bytes, start: int, end: int) -> FrameInfo:
+    frame = FrameInfo(FrameKind.RESPONSE)
+    for field, wire_type, value, _ in _iter_fields(data, start, end):
+        if field == RESPONSE_SEQ and wire_type == WIRE_VARINT:
+            frame.seq = value
+        elif field == RESPONSE_ERROR:
+            frame.is_error = True
+    return frame
+
+
+def _classify_broadcast(data: bytes, start: int, end: int) -> FrameInfo:
+    for field, wire_type, value, value_end in _iter_fields(data, start, end):
+        if wire_type != WIRE_LENGTH:
+            continue
+
+        if field == BROADCAST_ENTITY_CHANGED:
+            frame = FrameInfo(FrameKind.ENTITY_CHANGED)
+            for sub_field, sub_type, sub_value, _ in _iter_fields(data, value, value_end):
+                if sub_field == ENTITY_CHANGED_ENTITY_ID and sub_type == WIRE_VARINT:
+                    frame.entity_id = sub_value
+                    break
+            return frame
+        if field == BROADCAST_TEAM_CHANGED:
+            return FrameInfo(FrameKind.TEAM_CHANGED)
+        if field == BROADCAST_TEAM_MESSAGE:
+            return FrameInfo(FrameKind.TEAM_MESSAGE)
+
+    return FrameInfo(FrameKind.OTHER_BROADCAST)
+
+
+def classify_frame(data: Union[bytes, str]) -> FrameInfo:
+    """
+    Reads only the field tags of a raw AppMessage to tell responses from each
+    kind of broadcast. Anything unexpected is reported as UNKNOWN so the caller
+    falls back to a full decode
+    """
+    if not isinstance(data, (bytes, bytearray)):
+        return FrameInfo()
+
+    try:
+        for field, wire_type, value, value_end in _iter_fields(data, 0, len(data)):
+            if wire_type != WIRE_LENGTH:
+                continue
+            if field == MESSAGE_RESPONSE:
+                return _classify_response(data, value, value_end)
+            if field == MESSAGE_BROADCAST:
+                return _classify_broadcast(data, value, value_end)
+    except (IndexError, ValueError):
+        pass
+
+    return FrameInfo()
+
+
+def classify_message(app_message: AppMessage) -> FrameInfo:
+    broadcast = app_message.broadcast
+    if betterproto.serialized_on_wire(broadcast.entity_changed):
+        return FrameInfo(FrameKind.ENTITY_CHANGED, entity_id=broadcast.entity_changed.entity_id)
+    if betterproto.serialized_on_wire(broadcast.team_changed):
+        return FrameInfo(FrameKind.TEAM_CHANGED)
+    if betterproto.serialized_on_wire(broadcast.team_message):
+        return FrameInfo(FrameKind.TEAM_MESSAGE)
+    if betterproto.serialized_on_wire(broadcast):
+        return FrameInfo(FrameKind.OTHER_BROADCAST)
+
+    return FrameInfo(
+        FrameKind.RESPONSE,
+        seq=app_message.response.seq,
+        is_error=app_message.response.error.error != ""
+    )
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, Union
+
+from ...exceptions import ClientNotConnectedError
+
+
+class Priority:
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+
+# Requests made without an explicit priority inherit the one set for the current task,
+# e.g. everything a chat command sends runs at Priority.HIGH
+current_priority: ContextVar[int] = ContextVar("rustwplus_priority", default=Priority.NORMAL)
+
+
+@contextlib.contextmanager
+def use_priority(priority: int) -> Iterator[None]:
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class OutboundQueue:
+    """
+    Feeds a single writer task, so frames reach the socket one at a time and
+    in priority order. Frames of equal priority keep their submission order
+    """
+
+    def __init__(self, sender: Callable[[bytes], Awaitable[None]]) -> None:
+        self.sender = sender
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+        self.queue: Union[asyncio.PriorityQueue, None] = None
+        self.task: Union[asyncio.Task, None] = None
+        self._counter = itertools.count()
+
+        self.depth: Dict[int, int] = {priority: 0 for priority in Priority.NAMES}
+        self.sent: Dict[int, int] = {priority: 0 for priority in Priority.NAMES}
+        self.total_wait: Dict[int, float] = {priority: 0.0 for priority in Priority.NAMES}
+        self.max_wait: Dict[int, float] = {priority: 0.0 for priority in Priority.NAMES}
+
+    def start(self) -> None:
+        if self.task is not None:
+            return
+
+        self.queue = asyncio.PriorityQueue()
+        self.task = asyncio.create_task(self._write(), name="[RustWPlus.py] Websocket Writer Task")
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+        while not self.queue.empty():
+            priority, _, _, _, future = self.queue.get_nowait()
+            self.depth[priority] -= 1
+            if not future.done():
+                future.set_exception(ClientNotConnectedError("Writer stopped"))
+        self.queue = None
+
+    async def send(self, data: bytes, priority: int = Priority.NORMAL) -> None:
+        if self.queue is None:
+            raise ClientNotConnectedError("Writer is not running")
+
+        priority = min(max(priority, Priority.HIGH), Priority.LOW)
+        future = asyncio.get_running_loop().create_future()
+
+        self.queue.put_nowait((priority, next(self._counter), time.monotonic(), data, future))
+        self.depth[priority] += 1
+
+        await future
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        return {
+            name: {
+                "depth": self.depth[priority],
+                "sent": self.sent[priority],
+                "avg_wait": self.total_wait[priority] / self.sent[priority] if self.sent[priority] else 0.0,
+                "max_wait": self.max_wait[priority],
+            }
+            for priority, name in Priority.NAMES.items()
+        }
+
+    async def _write(self) -> None:
+        while True:
+            priority, _, queued_at, data, future = await self.queue.get()
+            self.depth[priority] -= 1
+
+            if future.done():
+                continue
+
+            waited = time.monotonic() - queued_at
+            try:
+                await self.sender(data)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            self.sent[priority] += 1
+            self.total_wait[priority] += waited
+            self.max_wait[priority] = max(self.max_wait[priority], waited)
+
+            if not future.done():
+                future.set_result(None)
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Any, Callable, Dict, Tuple, Union
+
+
+class PendingRequests:
+    """
+    Correlates request sequence numbers with the futures awaiting their
+    responses. Deadlines are plain loop timers, so a pending request costs
+    one future and one timer handle. A request can be registered before it
+    is written and armed once it is, so its deadline does not include the
+    time it spent queued
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[int, Tuple[asyncio.Future, Union[asyncio.TimerHandle, None]]] = {}
+        self.timed_out: int = 0
+        self.failed: int = 0
+
+    def register(self, seq: int, timeout: Union[float, None] = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        handle = loop.call_later(timeout, self._expire, seq) if timeout is not None else None
+
+        self.discard(seq)
+        self._pending[seq] = (future, handle)
+        return future
+
+    def arm(self, seq: int, timeout: float) -> bool:
+        """
+        Starts the deadline of a registered request. Does nothing if the
+        response already arrived
+        """
+        entry = self._pending.get(seq)
+        if entry is None:
+            return False
+
+        future, handle = entry
+        if handle is not None:
+            handle.cancel()
+        self._pending[seq] = (future, asyncio.get_running_loop().call_later(timeout, self._expire, seq))
+        return True
+
+    def get(self, seq: int) -> Union[asyncio.Future, None]:
+        entry = self._pending.get(seq)
+        return entry[0] if entry is not None else None
+
+    def resolve(self, seq: int, value: Any) -> bool:
+        entry = self._pending.pop(seq, None)
+        if entry is None:
+            return False
+
+        future, handle = entry
+        if handle is not None:
+            handle.cancel()
+        if not future.done():
+            future.set_result(value)
+        return True
+
+    def discard(self, seq: int) -> None:
+        entry = self._pending.pop(seq, None)
+        if entry is None:
+            return
+
+        future, handle = entry
+        if handle is not None:
+            handle.cancel()
+        if not future.done():
+            future.cancel()
+
+    def fail_all(self, make_result: Callable[[int], Any]) -> int:
+        pending, self._pending = self._pending, {}
+
+        for seq, (future, handle) in pending.items():
+            if handle is not None:
+                handle.cancel()
+            if not future.done():
+                future.set_result(make_result(seq))
+
+        self.failed += len(pending)
+        return len(pending)
+
+    def _expire(self, seq: int) -> None:
+        entry = self._pending.pop(seq, None)
+        if entry is None:
+            return
+
+        future, _ = entry
+        if not future.done():
+            self.timed_out += 1
+            future.set_result(None)
+
+    def __contains__(self, seq: int) -> bool:
+        return seq in self._pending
+
+    def __len__(self) -> int:
+        return len(self._pending)
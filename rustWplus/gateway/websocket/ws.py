@@ -1,13 +1,21 @@
 import shlex
 import betterproto
-from websockets.exceptions import InvalidURI, InvalidHandshake, ConnectionClosedError
+from websockets.exceptions import InvalidURI, InvalidHandshake, ConnectionClosed
 from websockets.legacy.client import WebSocketClientProtocol
 from websockets.client import connect
 from asyncio import TimeoutError, Task
-from typing import Union, Optional, Set, Dict
+from typing import Awaitable, Callable, Coroutine, Union, Optional, Set, Dict, Tuple
+from collections import deque
 import logging
 import asyncio
-
+import random
+import time
+
+from .dispatcher import MessageDispatcher
+from .pending_requests import PendingRequests
+from .frame_classifier import FrameInfo, FrameKind, classify_frame, classify_message
+from .outbound import OutboundQueue, Priority, current_priority, use_priority
+from ..ratelimiter import use_consumer
 from ..proxy import ProxyValueGrabber
 from ..rustplus_proto import AppMessage, AppRequest, AppError
 from ...commands import CommandOptions, ChatCommand, ChatCommandTime
@@ -16,21 +24,35 @@ from ...events import (
     EntityEventPayload,
     TeamEventPayload,
     ChatEventPayload,
+    ConnectionEventPayload,
 )
-from ...exceptions import RequestError
+from ...exceptions import ClientNotConnectedError, RequestError
 from ...identification import RustServer, RegisteredListener
 from ...rust_models import RustChatMessage, RustTeamInfo
-from ...utils import YieldingEvent, convert_time, error_present
+from ...state import ChatBuffer, EntityStore, TeamMirror
+from ...utils import convert_time, error_present
 
 
 class RustWebSocket:
     RESPONSE_TIMEOUT = 10
+    RECONNECT_BASE_DELAY = 1
+    RECONNECT_MAX_DELAY = 60
+    RECONNECT_MAX_ATTEMPTS = None
+    PING_INTERVAL = 20
+    PING_TIMEOUT = 10
+    RTT_SAMPLES = 32
+
     def __init__(
             self,
             server_details: RustServer,
             command_options: Union[CommandOptions, None],
             use_fp_proxy: bool,
-            debug: bool
+            debug: bool,
+            dispatch_workers: Union[int, None] = None,
+            dispatch_queue_size: Union[int, None] = None,
+            reconnect: bool = True,
+            ping_interval: Union[float, None] = None,
+            ping_timeout: Union[float, None] = None,
     ) -> None:
         self.server_details: RustServer = server_details
         self.command_options: Union[CommandOptions, None] = command_options
@@ -38,13 +60,51 @@ class RustWebSocket:
         self.task: Union[Task, None] = None
         self.use_fp_proxy: bool = use_fp_proxy
         self.logger: logging.Logger = logging.getLogger("rustWplus.py")
-        self.responses: Dict[int, YieldingEvent] = {}
+        self.responses: PendingRequests = PendingRequests()
         self.open: bool = False
         self.debug: bool = debug
+        self.frames_skipped: int = 0
+        self.reconnect: bool = reconnect
+        self.reconnects: int = 0
+        self.on_reconnect: Union[Callable[[], Awaitable[None]], None] = None
+        # Sees every response that reaches the reader, so must not block
+        self.on_response: Union[Callable[[AppMessage], None], None] = None
+        self.entities: EntityStore = EntityStore()
+        self.team: TeamMirror = TeamMirror()
+        self.chat: ChatBuffer = ChatBuffer()
+        self.background_tasks: Set[Task] = set()
+        self.ping_interval: float = ping_interval or self.PING_INTERVAL
+        self.ping_timeout: float = ping_timeout or self.PING_TIMEOUT
+        self.heartbeat_task: Union[Task, None] = None
+        self.heartbeats_missed: int = 0
+        self.rtt_samples: deque = deque(maxlen=self.RTT_SAMPLES)
+        self.connection_lost: Union[asyncio.Future, None] = None
+        self.closed: asyncio.Event = asyncio.Event()
+        self.outbound: OutboundQueue = OutboundQueue(self.write)
+        self.dispatcher: MessageDispatcher = MessageDispatcher(
+            self.dispatch,
+            workers=dispatch_workers,
+            queue_size=dispatch_queue_size,
+            on_drop=self.on_dispatch_dropped
+        )
 
     
     async def connect(self) -> bool:
+        if not await self.open_connection():
+            await ProxyValueGrabber.release(self)
+            return False
 
+        self.dispatcher.start()
+        self.outbound.start()
+        self.task = asyncio.create_task(self.run(), name="[RustWPlus.py] Websocket Polling Task")
+
+        self.open = True
+        self.closed.clear()
+        self.emit_connection_event(ConnectionEventPayload(ConnectionEventPayload.CONNECTED))
+
+        return True
+
+    async def open_connection(self) -> bool:
         address = ( 
             (
                 f"{'wss' if self.server_details.secure else 'ws'}://"
@@ -52,7 +112,7 @@ class RustWebSocket:
             )
             if not self.use_fp_proxy
             else f"wss://companion-rust.facepunch.com/game/{self.server_details.ip}/{self.server_details.port}"
-        ) + f"?v={ProxyValueGrabber.get_value()}"
+        ) + f"?v={await ProxyValueGrabber.get_value(self)}"
 
         try:
             self.connection = await connect(
@@ -66,15 +126,69 @@ class RustWebSocket:
             return False
         if self.debug:
             self.logger.info(f"Websocket connection established to {address}")
-        
-        self.task = asyncio.create_task(self.run(), name="[RustWPlus.py] Websocket Polling Task")
 
-        self.open = True
+        self.connection_lost = asyncio.get_running_loop().create_future()
+        self.heartbeat_task = asyncio.create_task(
+            self.heartbeat(self.connection), name="[RustWPlus.py] Websocket Heartbeat Task"
+        )
 
         return True
+
+    async def heartbeat(self, connection: WebSocketClientProtocol) -> None:
+        # Transport level ping/pong, so liveness checks never spend rate limit tokens
+        while True:
+            await asyncio.sleep(self.ping_interval)
+
+            started = time.monotonic()
+            try:
+                pong_waiter = await connection.ping()
+                await asyncio.wait_for(pong_waiter, self.ping_timeout)
+            except asyncio.TimeoutError:
+                self.heartbeats_missed += 1
+                self.logger.warning(f"No pong received within {self.ping_timeout}s, closing connection")
+                await connection.close()
+                return
+            except ConnectionClosed:
+                return
+
+            self.rtt_samples.append(time.monotonic() - started)
+
+    def mark_connection_lost(self, reason: str) -> None:
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+        if self.connection_lost is not None and not self.connection_lost.done():
+            self.connection_lost.set_result(reason)
+
+        self.entities.clear()
+        self.team.invalidate()
+        self.chat.invalidate()
+
+    async def wait_closed(self) -> None:
+        """
+        Waits until the socket is closed for good, either by disconnect() or
+        because reconnecting gave up
+        """
+        await self.closed.wait()
+
+    @property
+    def latency(self) -> Union[float, None]:
+        return self.rtt_samples[-1] if self.rtt_samples else None
+
+    @property
+    def heartbeat_stats(self) -> Dict[str, Union[float, int, None]]:
+        samples = list(self.rtt_samples)
+        return {
+            "rtt_last": samples[-1] if samples else None,
+            "rtt_avg": sum(samples) / len(samples) if samples else None,
+            "rtt_max": max(samples) if samples else None,
+            "samples": len(samples),
+            "missed": self.heartbeats_missed,
+        }
     
     async def disconnect(self) -> None:
-        if self.connection and self.task:
+        if self.task:
             self.task.cancel()
             try:
                 await self.task
@@ -82,49 +196,186 @@ class RustWebSocket:
                 pass
 
             self.task = None
+            await self.dispatcher.stop()
+            await self.outbound.stop()
 
             self.open = False
-            await self.connection.close()
+            self.mark_connection_lost("Disconnected")
+            if self.connection:
+                await self.connection.close()
             self.connection = None
+            self.closed.set()
+            self.fail_pending("Connection closed")
+            await ProxyValueGrabber.release(self)
+            self.emit_connection_event(ConnectionEventPayload(ConnectionEventPayload.DISCONNECTED))
+
+    async def reconnect_with_backoff(self) -> bool:
+        attempt = 0
+        while self.RECONNECT_MAX_ATTEMPTS is None or attempt < self.RECONNECT_MAX_ATTEMPTS:
+            attempt += 1
+
+            # Exponential backoff with jitter, so several bots do not reconnect in lockstep
+            ceiling = min(self.RECONNECT_MAX_DELAY, self.RECONNECT_BASE_DELAY * 2 ** (attempt - 1))
+            delay = ceiling * (0.5 + random.random() / 2)
+
+            self.logger.warning(f"Reconnecting to {self.server_details.get_server_string()} in {delay:.1f}s (attempt {attempt})")
+            self.emit_connection_event(
+                ConnectionEventPayload(ConnectionEventPayload.RECONNECTING, attempt=attempt, delay=delay)
+            )
+            await asyncio.sleep(delay)
+
+            if await self.open_connection():
+                self.reconnects += 1
+                self.logger.info(f"Reconnected to {self.server_details.get_server_string()}")
+                if self.on_reconnect is not None:
+                    self.spawn(self.on_reconnect())
+                self.emit_connection_event(
+                    ConnectionEventPayload(ConnectionEventPayload.RECONNECTED, attempt=attempt)
+                )
+                return True
+
+        self.emit_connection_event(ConnectionEventPayload(ConnectionEventPayload.FAILED, attempt=attempt))
+        return False
+
+    def spawn(self, coroutine: Coroutine) -> Task:
+        # Keeps a reference so the task cannot be garbage collected mid-flight
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def emit_connection_event(self, payload: ConnectionEventPayload) -> None:
+        handlers = ConnectionEventPayload.HANDLER_LIST.get_handlers(self.server_details)
+        if handlers:
+            self.spawn(self.run_connection_event(handlers, payload))
+
+    @staticmethod
+    async def run_connection_event(handlers: Set[RegisteredListener], payload: ConnectionEventPayload) -> None:
+        for handler in handlers:
+            await handler.get_coro()(payload)
+
+    def fail_pending(self, reason: str) -> int:
+        return self.responses.fail_all(lambda seq: self.error_message(seq, reason))
 
     async def run(self) -> None:
         while self.open:
             try:
                 data = await self.connection.recv()
 
-                asyncio.create_task(self.run_proto_event(data, self.server_details))
+                # Raw listeners get the bytes as received, before and regardless of decoding
+                if ProtobufEventPayload.HANDLER_LIST.get_handlers(self.server_details):
+                    self.spawn(self.run_proto_event(data, self.server_details))
 
-                app_message = AppMessage()
-                app_message.parse(data)
+                # Decoded only when the frame cannot be classified from its header
+                app_message = None
+                frame = classify_frame(data)
+                if frame.kind == FrameKind.UNKNOWN:
+                    app_message = AppMessage().parse(data)
+                    frame = classify_message(app_message)
 
-            except ConnectionClosedError as e:
+            except ConnectionClosed as e:
                 if self.debug:
                     self.logger.warning(f"Connection Interrupted: {e}")
-                    break
+                self.connection = None
+                self.mark_connection_lost(str(e))
+                self.fail_pending("Connection closed")
+                self.emit_connection_event(
+                    ConnectionEventPayload(ConnectionEventPayload.DISCONNECTED, reason=str(e))
+                )
+
+                if self.reconnect and await self.reconnect_with_backoff():
+                    continue
+
+                self.open = False
+                await ProxyValueGrabber.release(self)
+                self.closed.set()
+                break
             
             except Exception as e:
                 if self.debug:
                     self.logger.exception(f"Error occurred whilst parsing the message from server: {e}")
                 continue
-            try:
-                asyncio.create_task(self.handle_message(app_message))
-            except Exception as e:
-                self.logger.exception(
-                    f"An Error occurred whilst handling the message from the server %s",
-                    e,
-                )
+
+            # Responses are resolved here so that a handler awaiting a response
+            # can never be stuck behind its own worker queue
+            if frame.kind == FrameKind.RESPONSE:
+                if frame.seq in self.responses or frame.is_error or self.debug:
+                    try:
+                        self.handle_response(app_message or AppMessage().parse(data))
+                    except Exception as e:
+                        self.logger.exception(f"Error occurred whilst parsing the message from server: {e}")
+                else:
+                    self.frames_skipped += 1
+                continue
+
+            if not self.is_broadcast_wanted(frame):
+                self.frames_skipped += 1
+                continue
+
+            # Waits while the handlers are behind. Responses are resolved above, so a
+            # handler awaiting one can not keep the reader stuck past put_timeout
+            await self.dispatcher.put(self.get_dispatch_key(frame), (data, app_message, frame))
+
+    def on_dispatch_dropped(self, key: str, item: Tuple[bytes, Union[AppMessage, None], FrameInfo]) -> None:
+        # The mirrors would silently miss the update, so they fall back to asking the server
+        _, _, frame = item
+        if frame.kind == FrameKind.TEAM_MESSAGE:
+            self.chat.invalidate()
+        elif frame.kind == FrameKind.TEAM_CHANGED:
+            self.team.invalidate()
+        elif frame.kind == FrameKind.ENTITY_CHANGED:
+            self.entities.forget(frame.entity_id)
+
+    async def dispatch(self, item: Tuple[bytes, Union[AppMessage, None], FrameInfo]) -> None:
+        data, app_message, frame = item
+        await self.handle_message(app_message or AppMessage().parse(data), frame)
+
+    def is_broadcast_wanted(self, frame: FrameInfo) -> bool:
+        if frame.kind == FrameKind.ENTITY_CHANGED:
+            return (
+                self.entities.tracks(frame.entity_id)
+                or str(frame.entity_id) in EntityEventPayload.HANDLER_LIST.get_handlers(self.server_details)
+            )
+
+        if frame.kind == FrameKind.TEAM_CHANGED:
+            # Always feeds the team mirror
+            return True
+
+        if frame.kind == FrameKind.TEAM_MESSAGE:
+            # Always feeds the chat buffer
+            return True
+
+        return False
     
-    async def send_and_get(self, request: AppRequest) -> AppMessage:
-        if not await self.send_message(request):
-            message = AppMessage()
-            error = AppError()
-            error.error = "Message Failed to send"
-            message.response.seq = request.seq
-            message.response.error = error
-            return message
-        return await self.get_response(request.seq)
-
-    async def send_message(self, request: AppRequest, ignore_response: bool = False) -> bool:
+    async def send_and_get(self, request: AppRequest, priority: Union[int, None] = None) -> Union[AppMessage, None]:
+        # Registered before the write, so a response arriving right after it always finds its future
+        future = self.responses.register(request.seq)
+        try:
+            if not await self._send(request, priority):
+                return self.error_message(request.seq, "Message Failed to send")
+            self.responses.arm(request.seq, self.RESPONSE_TIMEOUT)
+            return await future
+        finally:
+            self.responses.discard(request.seq)
+
+    async def send_message(
+            self,
+            request: AppRequest,
+            ignore_response: bool = False,
+            priority: Union[int, None] = None
+    ) -> bool:
+        if not ignore_response:
+            self.responses.register(request.seq)
+
+        if not await self._send(request, priority):
+            self.responses.discard(request.seq)
+            return False
+
+        if not ignore_response:
+            self.responses.arm(request.seq, self.RESPONSE_TIMEOUT)
+        return True
+
+    async def _send(self, request: AppRequest, priority: Union[int, None] = None) -> bool:
         if self.connection is None:
             self.logger.warning("No Current WebSocket Connection")
             return False
@@ -132,38 +383,76 @@ class RustWebSocket:
         if self.debug:
             self.logger.info(f"Sending Message[{request.seq}]: {request}")
         
-        if not ignore_response:
-            self.responses[request.seq] = YieldingEvent()
-        
+        if priority is None:
+            priority = current_priority.get()
+
         try:
-            await self.connection.send(bytes(request))
+            await self.outbound.send(bytes(request), priority)
         except Exception as err:
             self.logger.warning(f"WebSocket Connection Error: {err}")
             return False
         return True
             
+    async def write(self, data: bytes) -> None:
+        if self.connection is None:
+            raise ClientNotConnectedError("No Current WebSocket Connection")
+        await self.connection.send(data)
+
+    @property
+    def outbound_stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        return self.outbound.stats
+
     async def get_response(self, seq: int) -> Union[AppMessage, None]:
+        future = self.responses.get(seq)
+        if future is None:
+            return None
 
-        response = await self.responses[seq].wait(timeout=self.RESPONSE_TIMEOUT)
-        del self.responses[seq]
+        try:
+            return await future
+        finally:
+            self.responses.discard(seq)
 
-        return response
+    @property
+    def in_flight(self) -> int:
+        return len(self.responses)
+
+    @staticmethod
+    def error_message(seq: int, reason: str) -> AppMessage:
+        message = AppMessage()
+        error = AppError()
+        error.error = reason
+        message.response.seq = seq
+        message.response.error = error
+        return message
     
-    async def handle_message(self, app_message: AppMessage) -> None:
+    def handle_response(self, app_message: AppMessage) -> None:
         if self.debug:
             self.logger.info(f"Received Message[{app_message.response.seq}]: {app_message}")
-        
-        if error_present(app_message):
-            event: YieldingEvent = self.responses.get(app_message.response.seq, None)
-            if event is not None:
-                if self.debug:
-                    self.logger.info(f"Running Response With Error: {app_message}")
-                
-                event.set_with_value(app_message)
-            else:
-                raise RequestError(app_message.response.error.error)
-        
-        prefix = self.get_prefix(str(app_message.broadcast.team_message.message.message))
+
+        if self.on_response is not None:
+            self.on_response(app_message)
+
+        if self.responses.resolve(app_message.response.seq, app_message):
+            if self.debug:
+                self.logger.info(f"Running Response Event: {app_message}")
+        elif error_present(app_message):
+            self.logger.warning(f"Unhandled error response: {RequestError(app_message.response.error.error)}")
+
+    async def handle_message(self, app_message: AppMessage, frame: Union[FrameInfo, None] = None) -> None:
+        if self.debug:
+            self.logger.info(f"Received Broadcast: {app_message}")
+
+        if frame is None:
+            frame = classify_message(app_message)
+
+        if frame.kind == FrameKind.TEAM_MESSAGE:
+            self.chat.add(RustChatMessage(app_message.broadcast.team_message.message))
+
+        prefix = (
+            self.get_prefix(str(app_message.broadcast.team_message.message.message))
+            if frame.kind == FrameKind.TEAM_MESSAGE
+            else None
+        )
 
         if prefix is not None:
             if self.debug:
@@ -186,38 +475,47 @@ class RustWebSocket:
                 command,
                 parts[1:],
             )
-            if data is not None:
-                await data.coroutine(dao)
-            else:
-                for command_name, data in ChatCommand.REGISTERED_COMMANDS[self.server_details].items():
-                    if command in data.aliases or data.callable_func(command):
-                        await data.coroutine(dao)
+            if data is None:
+                for command_name, candidate in ChatCommand.REGISTERED_COMMANDS[self.server_details].items():
+                    if command in candidate.aliases or candidate.callable_func(command):
+                        data = candidate
                         break
 
-        if self.is_entity_broadcast(app_message):
+            if data is not None:
+                # Replies to interactive commands go ahead of background traffic. Commands run
+                # as their own tasks, so a slow one does not hold up the chat that follows it
+                with use_priority(Priority.HIGH), use_consumer("commands"):
+                    self.spawn(self.run_command(data.coroutine, dao))
+
+        if frame.kind == FrameKind.ENTITY_CHANGED:
             # Entity Event 
             if self.debug:
                 self.logger.info(f"Running Entity Event: {app_message}")
-            
+
+            self.entities.update_from_broadcast(app_message.broadcast.entity_changed)
             handlers = EntityEventPayload.HANDLER_LIST.get_handlers(self.server_details).get(str(app_message.broadcast.entity_changed.entity_id), [])
             for handler in handlers:
                 await handler.get_coro()(EntityEventPayload(entity_changed=app_message.broadcast.entity_changed)) 
 
-        elif self.is_team_broadcast(app_message):
+        elif frame.kind == FrameKind.TEAM_CHANGED:
             # Team Event
             if self.debug:
                 self.logger.info(f"Running Team Event: {app_message}")
 
+            team_info = RustTeamInfo(app_message.broadcast.team_changed.team_info)
+            changes = self.team.update(team_info, broadcast=True)
+
             handlers = TeamEventPayload.HANDLER_LIST.get_handlers(self.server_details)
             team_event = TeamEventPayload(
                 app_message.broadcast.team_changed.player_id,
-                RustTeamInfo(app_message.broadcast.team_changed.team_info)
+                team_info,
+                changes,
             )
             for handler in handlers:
                 await handler.get_coro()(team_event)
 
 
-        elif self.is_message(app_message):
+        elif frame.kind == FrameKind.TEAM_MESSAGE:
             # Chat Message Event
             if self.debug:
                 self.logger.info(f"Running Chat Event: {app_message}")
@@ -228,16 +526,15 @@ class RustWebSocket:
             )
             for handler in handlers:
                 await handler.get_coro()(chat_event)
-        
-        else:
-            # This means that it wasn't sent by the server and is a message from the server in response to an action
-            event: YieldingEvent = self.responses.get(app_message.response.seq, None)
-            if event is not None:
-                if self.debug:
-                    self.logger.info(f"Running Response Event: {app_message}")
-
-                event.set_with_value(app_message)
        
+    async def run_command(self, coroutine: Callable[[ChatCommand], Awaitable[None]], dao: ChatCommand) -> None:
+        try:
+            # Counts against the dispatch workers like any handler
+            async with self.dispatcher.slot():
+                await coroutine(dao)
+        except Exception as e:
+            self.logger.exception(f"An Error occurred whilst running the command {dao.command}: {e}")
+
     def get_prefix(self, message: str) -> Optional[str]:
         if self.command_options is None:
             return None
@@ -247,6 +544,18 @@ class RustWebSocket:
         else:
             return None
 
+    @staticmethod
+    def get_dispatch_key(frame: FrameInfo) -> str:
+        if frame.kind == FrameKind.ENTITY_CHANGED:
+            return f"entity:{frame.entity_id}"
+        if frame.kind == FrameKind.TEAM_CHANGED:
+            return "team"
+        return "chat"
+
+    @property
+    def dispatch_stats(self) -> Dict[str, int]:
+        return {**self.dispatcher.stats, "skipped": self.frames_skipped}
+
     @staticmethod
     def is_message(app_message: AppMessage) -> bool:
         return betterproto.serialized_on_wire(app_message.broadcast.team_message.message)
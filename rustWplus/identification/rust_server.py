@@ -32,8 +32,8 @@ class RustServer:
             return False
         
         return (
-            self.ip == obj.ip,
-            self.port == obj.port,
-            self.player_id == obj.player_id,
-            self.player_token == obj.player_token
+            self.ip == obj.ip
+            and self.port == obj.port
+            and self.player_id == obj.player_id
+            and self.player_token == obj.player_token
         )
\ No newline at end of file
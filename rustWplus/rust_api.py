@@ -1,22 +1,22 @@
 import asyncio
-from importlib import resources
-from io import BytesIO
-from typing import List, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Set, Tuple, Union
 import logging
 from PIL import Image
 
 from .commands import CommandOptions
 from .identification import RustServer
 from .gateway.rustplus_proto import (
+    AppMessage,
     AppRequest,
     AppEmpty,
     AppSendMessage,
     AppSetEntityValue,
     AppPromoteToLeader,
-    AppMapMonument,
+    AppMap,
     AppFlag,
 )
-from .gateway.websocket import RustWebSocket
+from .gateway.websocket import RustWebSocket, Priority
+from .gateway.websocket.outbound import current_priority
 from .rust_models import (
     RustTime,
     RustServerInfo,
@@ -30,23 +30,51 @@ from .rust_models import (
 from .rust_models.rust_error import RustError
 from .utils import (
     convert_time,
-    generate_grid,
     fetch_avatar_icon,
     format_coords,
-    convert_marker,
-    convert_monument,
+    SingleFlight,
+    ResponseCache,
+    MapCache,
+    MapRenderer,
 )
-from .gateway.ratelimiter import RateLimiter
+from .gateway.ratelimiter import RateLimiter, Reservation, current_reservation
+from .gateway.ratelimiter.fair_queue import DEFAULT_CONSUMER, current_consumer
+from .state import MarkerDiff, MarkerWatcher
 from .utils.utils import error_present
 
 class RustSocket:
+    COALESCED_METHODS = {
+        "get_info": True,
+        "get_time": True,
+        "get_markers": True,
+        "get_team_info": True,
+        "get_map": True,
+    }
+    # Requests a batch call keeps in flight at once
+    PIPELINE_WINDOW = 8
+    # Rate limit consumers charged for requests made at a priority without a named
+    # consumer, so priority also applies while waiting for tokens. NORMAL stays on
+    # the default consumer
+    PRIORITY_CONSUMERS = {Priority.HIGH: "high", Priority.LOW: "low"}
+    # (weight, minimum) they are registered with unless configured otherwise
+    PRIORITY_POLICIES = {"high": (4, 1), "low": (0.5, 0)}
+
     def __init__(
             self,
             server_details: RustServer,
             ratelimiter: Union[RateLimiter, None] = None,
             command_options: Union[CommandOptions, None] = None,
             use_fp_proxy: bool = False,
-            debug: bool = False
+            debug: bool = False,
+            dispatch_workers: Union[int, None] = None,
+            dispatch_queue_size: Union[int, None] = None,
+            reconnect: bool = True,
+            ping_interval: Union[float, None] = None,
+            ping_timeout: Union[float, None] = None,
+            coalesce: Union[Dict[str, bool], None] = None,
+            cache: Union[ResponseCache, None] = None,
+            map_cache: Union[MapCache, None] = None,
+            map_renderer: Union[MapRenderer, None] = None,
     ) -> None:
         self.server_details: RustServer = server_details
         self.command_options: Union[CommandOptions, None] = command_options
@@ -64,9 +92,24 @@ class RustSocket:
             self.server_details,
             self.command_options,
             use_fp_proxy,
-            debug
+            debug,
+            dispatch_workers=dispatch_workers,
+            dispatch_queue_size=dispatch_queue_size,
+            reconnect=reconnect,
+            ping_interval=ping_interval,
+            ping_timeout=ping_timeout
         )
+        self.ws.on_reconnect = self._restore_session
+        self.ws.on_response = self._observe_response
         self.seq = 1
+        self.subscriptions: Set[int] = set()
+
+        self.coalesce: Dict[str, bool] = {**self.COALESCED_METHODS, **(coalesce or {})}
+        self.single_flight = SingleFlight()
+        self.cache: ResponseCache = cache if cache is not None else ResponseCache()
+        self.map_cache: MapCache = map_cache if map_cache is not None else MapCache()
+        self.map_renderer: MapRenderer = map_renderer if map_renderer is not None else MapRenderer()
+        self.marker_watcher = MarkerWatcher(self.get_markers, lambda: self.ws.open)
 
 
         if ratelimiter:
@@ -75,20 +118,98 @@ class RustSocket:
             self.ratelimiter = RateLimiter()
         
         self.ratelimiter.add_socket(self.server_details)
+        for name, (weight, minimum) in self.PRIORITY_POLICIES.items():
+            if name not in self.ratelimiter.consumers:
+                self.ratelimiter.set_consumer(name, weight=weight, minimum=minimum)
+        self.marker_watcher.budget = lambda: self.ratelimiter.available(self.server_details)
 
 
-    async def _handle_ratelimit(self, tokens) -> None:
-        while True:
-            if await self.ratelimiter.can_consume(self.server_details, tokens):
-                await self.ratelimiter.consume(self.server_details, tokens)
-                break
-            
-            await asyncio.sleep(
-                await self.ratelimiter.get_estimated_delay_time(self.server_details, tokens)
-            )
+    async def _handle_ratelimit(self, tokens, priority: Union[int, None] = None) -> None:
+        reservation = current_reservation.get()
+        if reservation is not None and reservation.take(self.server_details, tokens):
+            return
+
+        consumer = None
+        if current_consumer.get() == DEFAULT_CONSUMER:
+            consumer = self.PRIORITY_CONSUMERS.get(current_priority.get() if priority is None else priority)
+
+        await self.ratelimiter.acquire(self.server_details, tokens, consumer)
+
+    def reserve(self, tokens: int, consumer: Union[str, None] = None) -> Reservation:
+        """
+        Reserves tokens for a batch of requests. Requests made inside
+        ``async with socket.reserve(n):`` draw from the reservation, and unused
+        tokens are returned on exit. ``eta`` estimates the wait before entering
+        """
+        return self.ratelimiter.reserve(self.server_details, tokens, consumer)
+
+    def _observe_response(self, app_message: AppMessage) -> None:
+        if app_message.response.error.error in self.ratelimiter.RATE_LIMIT_ERRORS:
+            self.ratelimiter.on_rate_limited(self.server_details)
+
+    async def _coalesced(self, method: str, tokens: int, fetch: Callable[[], Awaitable[Any]], key: Union[str, None] = None) -> Any:
+        if self.cache.enabled(method):
+            found, value = self.cache.get(method)
+            if found:
+                return value
+
+            fetch = self._storing(method, fetch)
 
-    async def _generate_request(self, tokens:int = 1) -> AppRequest:
-        await self._handle_ratelimit(tokens)
+        # Identical read-only calls already in flight share one request and its tokens
+        if not self.coalesce.get(method, False):
+            return await fetch()
+
+        return await self.single_flight.do(key or method, fetch, tokens)
+
+    def _storing(self, method: str, fetch: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        async def fetch_and_store() -> Any:
+            value = await fetch()
+            if not isinstance(value, RustError):
+                self.cache.set(method, value, len(getattr(value, "jpg_image", b"")) or None)
+            return value
+
+        return fetch_and_store
+
+    def invalidate_cache(self, method: Union[str, None] = None) -> None:
+        """
+        Drops the cached response of a read method, or of every method when none is given
+        """
+        self.cache.invalidate(method)
+
+    @property
+    def coalesce_stats(self) -> Dict[str, Any]:
+        return self.single_flight.stats
+
+    @property
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats
+
+    @property
+    def entity_stats(self) -> Dict[str, Any]:
+        return self.ws.entities.stats
+
+    @property
+    def team_stats(self) -> Dict[str, Any]:
+        return self.ws.team.stats
+
+    @property
+    def chat_cursor(self) -> int:
+        return self.ws.chat.cursor
+
+    @property
+    def chat_stats(self) -> Dict[str, Any]:
+        return self.ws.chat.stats
+
+    @property
+    def map_cache_stats(self) -> Dict[str, Any]:
+        return self.map_cache.stats
+
+    @property
+    def map_renderer_stats(self) -> Dict[str, Any]:
+        return self.map_renderer.stats
+
+    async def _generate_request(self, tokens:int = 1, priority: Union[int, None] = None) -> AppRequest:
+        await self._handle_ratelimit(tokens, priority)
 
         app_request = AppRequest()
         app_request.seq = self.seq
@@ -101,11 +222,18 @@ class RustSocket:
     async def connect(self) -> bool:
         if await self.ws.connect():
             await self.get_time()
+            await self._load_team_chat()
             return True
         return False
     
     async def disconnect(self) -> None:
         await self.ws.disconnect()
+        self.map_renderer.close()
+
+    async def _restore_session(self) -> None:
+        await self._load_team_chat()
+        for entity_id in list(self.subscriptions):
+            await self.set_subscription_to_entity(entity_id, True)
 
     
     @staticmethod
@@ -126,6 +254,9 @@ class RustSocket:
 
         """
 
+        return await self._coalesced("get_time", 1, self._get_time)
+
+    async def _get_time(self) -> Union[RustTime, RustError]:
         packet = await self._generate_request(tokens=1)
         packet.get_time = AppEmpty()
         response = await self.ws.send_and_get(packet)
@@ -153,6 +284,9 @@ class RustSocket:
 
         """
 
+        return await self._coalesced("get_info", 1, self._get_info)
+
+    async def _get_info(self) -> Union[RustServerInfo, RustError]:
         packet = await self._generate_request(tokens = 1)
         packet.get_info = AppEmpty()
         response = await self.ws.send_and_get(packet)
@@ -162,17 +296,33 @@ class RustSocket:
         
         if error_present(response):
             return RustError("get_info", response.response.error.error)
+
+        server_info = RustServerInfo(response.response.info)
+        if self.cache.observe_server(server_info.wipe_time, server_info.seed):
+            self.logger.info("Server wipe detected, cached map data dropped")
         
-        return RustServerInfo(response.response.info)
+        return server_info
     
 
-    async def get_team_chat(self) -> Union[List[RustChatMessage], RustError]:
+    async def get_team_chat(self, since: Union[int, None] = None) -> Union[List[RustChatMessage], RustError]:
         """
         
         Gets the team chat
+
+        since: Only messages received after this cursor, a chat_cursor value
+            read earlier. Served from the chat buffer kept from broadcasts
+            once it was filled after connecting
         
         """
 
+        if not self.ws.chat.filled:
+            messages = await self.single_flight.do("get_team_chat", self._load_team_chat, 1)
+            if isinstance(messages, RustError):
+                return messages
+
+        return self.ws.chat.since(since)
+
+    async def _load_team_chat(self) -> Union[List[RustChatMessage], RustError]:
         packet = await self._generate_request(tokens = 1)
         packet.get_team_chat = AppEmpty()
         response = await self.ws.send_and_get(packet)
@@ -183,17 +333,30 @@ class RustSocket:
         if error_present(response):
             return RustError("get_team_chat", response.response.error.error)
         
-        return [
+        messages = [
             RustChatMessage(message) for message in response.response.team_chat.messages
         ]
+        self.ws.chat.extend(messages)
+        self.ws.chat.filled = True
+        return messages
     
-    async def get_team_info(self) -> Union[RustTeamInfo, RustError]:
+    async def get_team_info(self, max_age: Union[float, None] = None) -> Union[RustTeamInfo, RustError]:
         """
         
         Gets the team info
 
+        max_age: Seconds the snapshot mirrored from team broadcasts may be old
+            to be returned without a request, 0 always asks the server
+
         """
 
+        team_info = self.ws.team.get(max_age)
+        if team_info is not None:
+            return team_info
+
+        return await self._coalesced("get_team_info", 1, self._get_team_info)
+
+    async def _get_team_info(self) -> Union[RustTeamInfo, RustError]:
         packet = await self._generate_request(tokens = 1)
         packet.get_team_info = AppEmpty()
         response = await self.ws.send_and_get(packet)
@@ -203,19 +366,29 @@ class RustSocket:
 
         if error_present(response):
             return RustError("get_team_info", response.response.error.error)
-        
-        return RustTeamInfo(response.response.team_info)
+
+        team_info = RustTeamInfo(response.response.team_info)
+        self.ws.team.update(team_info)
+        return team_info
     
-    async def get_markers(self) -> Union[List[RustMarker], RustError]:
+    async def get_markers(self, priority: int = Priority.LOW) -> Union[List[RustMarker], RustError]:
         """
         
         Gets all server's markers
+
+        priority: Outbound priority, marker polling is background traffic by default
         
         """
 
-        packet = await self._generate_request()
+        # Keyed by priority, so a HIGH caller never joins a LOW poll and inherits its place
+        return await self._coalesced(
+            "get_markers", 1, lambda: self._get_markers(priority), key=f"get_markers:{priority}"
+        )
+
+    async def _get_markers(self, priority: int) -> Union[List[RustMarker], RustError]:
+        packet = await self._generate_request(priority=priority)
         packet.get_map_markers = AppEmpty()
-        response = await self.ws.send_and_get(packet)
+        response = await self.ws.send_and_get(packet, priority)
 
         if response is None:
             return RustError("get_map_markers", "No response received")
@@ -230,17 +403,53 @@ class RustSocket:
         
         return [RustMarker(marker) for marker in markers]
     
-    async def get_monuments(self) -> Union[List[RustMonument], RustError]:
+    def watch_markers(self) -> AsyncIterator[MarkerDiff]:
+        """
+        Yields what changed on the map (added, removed and moved or changed
+        markers) after every marker poll. All watchers share one poll loop,
+        configured through socket.marker_watcher
+        """
+
+        return self.marker_watcher.watch()
+
+    async def _fetch_map(self, server_info: Union[RustServerInfo, None] = None) -> Union[AppMap, RustError]:
+        return await self._coalesced("get_map", 5, lambda: self._load_map(server_info))
+
+    async def _load_map(self, server_info: Union[RustServerInfo, None] = None) -> Union[AppMap, RustError]:
+        # get_info tells whether the map on disk is still this wipe's. Callers that
+        # already have it pass it in; otherwise it is usually served from the cache
+        if server_info is None:
+            server_info = await self.get_info()
+        if isinstance(server_info, RustError):
+            return await self._download_map()
+
+        app_map = await asyncio.to_thread(self.map_cache.load, self.server_details, server_info)
+        if app_map is not None:
+            return app_map
+
+        app_map = await self._download_map()
+        if not isinstance(app_map, RustError):
+            await asyncio.to_thread(self.map_cache.save, self.server_details, server_info, app_map)
+        return app_map
+
+    async def _download_map(self) -> Union[AppMap, RustError]:
         packet = await self._generate_request(tokens=5)
         packet.get_map = AppEmpty()
         response = await self.ws.send_and_get(packet)
 
         if response is None:
-            return RustError("get_map_monuments", "No response received")
+            return RustError("get_map", "No response received")
         if error_present(response):
-            return RustError("get_map_monuments", response.response.error.error)
+            return RustError("get_map", response.response.error.error)
+
+        return response.response.map
+
+    async def get_monuments(self) -> Union[List[RustMonument], RustError]:
+        map_packet = await self._fetch_map()
+        if isinstance(map_packet, RustError):
+            return RustError("get_map_monuments", map_packet.reason)
         
-        return [RustMonument(monument) for monument in response.response.map.monuments]
+        return [RustMonument(monument) for monument in map_packet.monuments]
     
     async def get_map(
             self,
@@ -265,105 +474,52 @@ class RustSocket:
 
         """
 
-        if add_extra_images is None:
-            add_extra_images = {}
-        
         server_info = await self.get_info()
         if isinstance(server_info, RustError):
             return server_info
         
-        map_size = server_info.size
-
-        packet = await self._generate_request(tokens = 5)
-        packet.get_map = AppEmpty()
-        response = await self.ws.send_and_get(packet)
-
-        if response is None:
-            return RustError("get_map", "No response received")
-
-        if error_present(response):
-            return RustError("get_map", response.response.error.error)
-        
-        map_packet = response.response.map
-        monuments: List[AppMapMonument] = map_packet.monuments
+        map_size = server_info.map_size
 
-        try:
-            output = Image.open(BytesIO(map_packet.jpg_image))
-        except Exception as e:
-            self.logger.error(f"Error opening image: {e}")
-            return RustError("get_map", str(e))
-        
-        output = output.crop(
-            (500, 500, map_packet.height - 500, map_packet.width - 500)
-        )
+        map_packet = await self._fetch_map(server_info)
+        if isinstance(map_packet, RustError):
+            return map_packet
 
-        output = output.resize((map_size, map_size), Image.LANCZOS).convert("RGBA")
+        map_markers = []
+        if add_events or add_vending_machines:
+            map_markers = await self.get_markers()
+            if isinstance(map_markers, RustError):
+                return map_markers
 
-        if show_grid:
-            output.paste(grid := generate_grid(map_size), (5, 5), grid)
-        
-        if add_icons or add_events or add_vending_machines:
-            map_markers = (
-                await self.get_markers() if add_events or add_vending_machines else []
-            )
-            
-            if add_icons:
-                for monument in monuments:
-                    if str(monument.token) == "DungeonBase":
-                        continue
-                    icon = convert_monument(str(monument.token), add_extra_images)
-                    if monument.token in add_extra_images:
-                        icon = icon.resize((150, 150))
-                    if str(monument.token) == "train_tunnel_display_name":
-                        icon = icon.resize((100, 125))
-                    
-                    output.paste(
-                        icon,
-                        (format_coords(x = int(monument.x), y = int(monument.y), map_size=map_size)),
-                        icon
-                    )
-
-        if add_vending_machines:
-            with resources.path("rustWplus.resources.icons", "vending_machine.png") as path:
-                vending_machine = Image.open(path).convert("RGBA")
-                vending_machine = vending_machine.resize((100, 100))
-
-        
-        for marker in map_markers:
-            if add_events:
-                if marker.type in [2, 4, 5, 6, 8]:
-                    icon = convert_marker(int(marker.type), marker.rotation)
-                    if marker.type == 6:
-                        x, y = marker.x, marker.y
-                        y = min(max(y, 0), map_size)
-                        x = min(max(x, 0), map_size - 75 if x > map_size else x)
-                        output.paste(icon, (int(x), map_size - int(y)), icon)
-                    else:
-                        output.paste(
-                            icon,
-                            (format_coords(int(marker.x), int(marker.y), map_size)),
-                            icon
-                        )
-            
-            if add_vending_machines and marker.type == 3:
-                output.paste(
-                    vending_machine,
-                    (int(marker.x) - 50, map_size - int(marker.y) - 50),
-                    vending_machine
-                )
+        avatars = []
         if add_team_positions:
             team = await self.get_team_info()
-            if team is not None:
+            if not isinstance(team, RustError):
                 for member in team.members:
                     if not member.is_alive:
                         continue
 
-                    output.paste(
-                        avatar := await fetch_avatar_icon(member.steam_id, member.is_online),
-                        format_coords(int(member.x), int(member.y), server_info.size),
-                        avatar
-                    )
-        return output
+                    avatars.append((
+                        await fetch_avatar_icon(member.steam_id, member.is_online),
+                        format_coords(int(member.x), int(member.y), map_size)
+                    ))
+
+        # Decoding, resizing and pasting take long enough to stall every other
+        # request on the socket, so the image is drawn in the renderer's pool
+        try:
+            return await self.map_renderer.render(
+                map_packet,
+                map_size,
+                map_markers,
+                avatars,
+                add_icons=add_icons,
+                add_events=add_events,
+                add_vending_machines=add_vending_machines,
+                add_extra_images=add_extra_images,
+                show_grid=show_grid,
+            )
+        except Exception as e:
+            self.logger.error(f"Error rendering map: {e}")
+            return RustError("get_map", str(e))
     
     async def get_map_info(self) -> Union[RustMap, RustError]:
         """
@@ -371,26 +527,26 @@ class RustSocket:
         Raw map data
 
         """
-        packet = await self._generate_request(tokens=5)
-        packet.get_map = AppEmpty()
-        response = await self.ws.send_and_get(packet)
-
-        if response is None:
-            return RustError("get_map_info", "No response received")
-
-        if error_present(response):
-            return RustError("get_map_info", response.response.error.error)
+        map_packet = await self._fetch_map()
+        if isinstance(map_packet, RustError):
+            return RustError("get_map_info", map_packet.reason)
         
-        return RustMap(response.response.map)
+        return RustMap(map_packet)
     
-    async def get_entity_info(self, entity_id: int = None) -> Union[RustEntityInfo, RustError]:
+    async def get_entity_info(self, entity_id: int = None, max_age: Union[float, None] = None) -> Union[RustEntityInfo, RustError]:
         """
         Gets entity info from the server
 
         entity_id: The Entities ID
+        max_age: Seconds a state mirrored from broadcasts may be old to be
+            returned without a request, 0 always asks the server
 
         """
 
+        cached = self.ws.entities.get(entity_id, entity_id in self.subscriptions, max_age)
+        if cached is not None:
+            return cached
+
         packet = await self._generate_request(tokens=1)
         packet.get_entity_info = AppEmpty()
         packet.entity_id = entity_id
@@ -402,26 +558,112 @@ class RustSocket:
         if error_present(response):
             return RustError("get_entity_info", response.response.error.error)
 
+        self.ws.entities.update_info(entity_id, response.response.entity_info)
         return RustEntityInfo(response.response.entity_info)
     
-    async def set_entity_value(self, entity_id: int, value: bool = False) -> None:
+    async def set_entity_value(self, entity_id: int, value: bool = False, priority: int = Priority.HIGH) -> None:
         """
         
         To turn on/off Smart Switch
+
+        priority: Outbound priority, switch toggles jump ahead of background traffic
         
         """
 
-        packet = await self._generate_request(tokens=1)
+        packet = await self._generate_request(tokens=1, priority=priority)
+        set_value = AppSetEntityValue()
+        set_value.value = value
+        packet.set_entity_value = set_value
+        packet.entity_id = entity_id
+
+        return await self.ws.send_message(packet, True, priority)
+
+    async def _set_entity_value_confirmed(self, entity_id: int, value: bool, priority: int) -> Union[bool, RustError]:
+        packet = await self._generate_request(tokens=1, priority=priority)
         set_value = AppSetEntityValue()
         set_value.value = value
         packet.set_entity_value = set_value
         packet.entity_id = entity_id
+        response = await self.ws.send_and_get(packet, priority)
+
+        if response is None:
+            return RustError("set_entity_value", "No response received")
+
+        if error_present(response):
+            return RustError("set_entity_value", response.response.error.error)
+
+        return True
+
+    async def get_entities_info(
+            self, entity_ids: Iterable[int], window: Union[int, None] = None
+    ) -> Dict[int, Union[RustEntityInfo, RustError]]:
+        """
+        Gets entity info for many entities, keeping up to window requests in flight
 
-        return await self.ws.send_message(packet, True)
+        Entities that failed map to a RustError
+        """
+
+        return {entity_id: info async for entity_id, info in self.iter_entities_info(entity_ids, window)}
+
+    async def iter_entities_info(
+            self, entity_ids: Iterable[int], window: Union[int, None] = None
+    ) -> AsyncIterator[Tuple[int, Union[RustEntityInfo, RustError]]]:
+        """
+        Yields (entity_id, info) pairs in the order the responses arrive
+        """
 
+        calls = ((entity_id, lambda entity_id=entity_id: self.get_entity_info(entity_id)) for entity_id in entity_ids)
+        async for entity_id, info in self._pipeline("get_entity_info", calls, window):
+            yield entity_id, info
 
+    async def set_entity_values(
+            self, values: Dict[int, bool], window: Union[int, None] = None, priority: int = Priority.HIGH
+    ) -> Dict[int, Union[bool, RustError]]:
+        """
+        Sets many smart switches at once, keeping up to window requests in flight
 
+        Returns True for every entity the server confirmed and a RustError for the rest
+        """
 
+        calls = (
+            (entity_id, lambda entity_id=entity_id, value=value: self._set_entity_value_confirmed(entity_id, value, priority))
+            for entity_id, value in values.items()
+        )
+        return {entity_id: result async for entity_id, result in self._pipeline("set_entity_value", calls, window)}
+
+    async def _pipeline(
+            self,
+            method: str,
+            calls: Iterable[Tuple[int, Callable[[], Awaitable[Any]]]],
+            window: Union[int, None] = None,
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        window = max(1, window or self.PIPELINE_WINDOW)
+        calls = iter(calls)
+        running: Dict[asyncio.Task, int] = {}
+
+        try:
+            while True:
+                while len(running) < window:
+                    call = next(calls, None)
+                    if call is None:
+                        break
+                    entity_id, make = call
+                    running[asyncio.ensure_future(make())] = entity_id
+
+                if not running:
+                    return
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    entity_id = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        result = RustError(method, str(e))
+                    yield entity_id, result
+        finally:
+            for task in running:
+                task.cancel()
 
     async def set_subscription_to_entity(self, entity_id: int, value: bool = True) -> None:
         """
@@ -438,6 +680,12 @@ class RustSocket:
         packet.set_subscription = flag
         packet.entity_id = entity_id
 
+        if value:
+            self.subscriptions.add(entity_id)
+        else:
+            self.subscriptions.discard(entity_id)
+            self.ws.entities.forget(entity_id)
+
         await self.ws.send_message(packet, True)
 
     async def check_subscription_to_entity(self, entity_id: int) -> Union[bool, RustError]:
@@ -464,32 +712,33 @@ class RustSocket:
         return response.response.flag.value
     
 
-    async def promote_to_leader(self, steamid: int = None) -> None:
+    async def promote_to_leader(self, steamid: int = None, priority: Union[int, None] = None) -> None:
         """
         Promotes a given user to the team leader by their SteamID64
 
         steamid: The SteamID of the player to promote
         """
-        packet = await self._generate_request(tokens=1)
+        packet = await self._generate_request(tokens=1, priority=priority)
         promote_packet = AppPromoteToLeader()
         promote_packet.steam_id = steamid
         packet.promote_to_leader = promote_packet
 
-        await self.ws.send_and_get(packet, True)
+        await self.ws.send_message(packet, True, priority)
     
 
-    async def send_team_message(self, message: str) -> None:
+    async def send_team_message(self, message: str, priority: Union[int, None] = None) -> None:
         """
         
         Sends message to your in-game team chat 
         
         message: message u want to send
+        priority: Outbound priority, inherited from the running command when not given
 
         """
 
-        packet = await self._generate_request(tokens=2)
+        packet = await self._generate_request(tokens=2, priority=priority)
         send_message = AppSendMessage()
         send_message.message = message
         packet.send_team_message = send_message
 
-        await self.ws.send_message(packet, True)
\ No newline at end of file
+        await self.ws.send_message(packet, True, priority)
\ No newline at end of file
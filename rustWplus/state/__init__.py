@@ -0,0 +1,4 @@
+from .entity_store import EntityStore
+from .team_mirror import TeamMirror, TeamChange
+from .chat_buffer import ChatBuffer
+from .marker_watcher import MarkerWatcher, MarkerDiff
\ No newline at end of file
@@ -0,0 +1,83 @@
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Tuple, Union
+
+from ..rust_models import RustChatMessage
+
+
+class ChatBuffer:
+    """
+    The most recent team chat messages in time order, fed by team_message
+    broadcasts and filled from get_team_chat after each connect. Messages are
+    deduplicated on (steam_id, time, message) and numbered in the order they
+    were buffered, which is the cursor since works with
+    """
+
+    MAX_MESSAGES = 256
+
+    def __init__(self, max_messages: Union[int, None] = None) -> None:
+        self.messages: Deque[RustChatMessage] = deque(maxlen=max_messages or self.MAX_MESSAGES)
+        # Key -> sequence number, for the messages still in the buffer
+        self._seen: Dict[Tuple[int, int, str], int] = {}
+        self.cursor: int = 0
+        # Whether the buffer holds the full history since the last connect
+        self.filled: bool = False
+
+        self.duplicates: int = 0
+        self.too_old: int = 0
+
+    @staticmethod
+    def key(message: RustChatMessage) -> Tuple[int, int, str]:
+        return message.steam_id, message.time, message.message
+
+    def add(self, message: RustChatMessage) -> bool:
+        key = self.key(message)
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+
+        if len(self.messages) == self.messages.maxlen:
+            if message.time < self.messages[0].time:
+                # Full, and older than everything kept, e.g. history loaded after broadcasts
+                self.too_old += 1
+                return False
+            self._seen.pop(self.key(self.messages.popleft()), None)
+
+        if self.messages and self.messages[-1].time > message.time:
+            # Older than the newest one, inserted in time order
+            index = len(self.messages)
+            while index > 0 and self.messages[index - 1].time > message.time:
+                index -= 1
+            self.messages.insert(index, message)
+        else:
+            self.messages.append(message)
+
+        self.cursor += 1
+        self._seen[key] = self.cursor
+        return True
+
+    def extend(self, messages: Iterable[RustChatMessage]) -> int:
+        return sum(self.add(message) for message in messages)
+
+    def since(self, cursor: Union[int, None] = None) -> List[RustChatMessage]:
+        """
+        Messages buffered after cursor (a previous value of self.cursor) in
+        time order, or all of them. Unlike the whole second message time, this
+        keeps messages sent in the same second and history loaded late
+        """
+        if cursor is None:
+            return list(self.messages)
+
+        return [message for message in self.messages if self._seen[self.key(message)] > cursor]
+
+    def invalidate(self) -> None:
+        # Broadcasts may be missed while disconnected, so refill on the next connect
+        self.filled = False
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": len(self.messages),
+            "filled": self.filled,
+            "duplicates": self.duplicates,
+            "too_old": self.too_old,
+        }
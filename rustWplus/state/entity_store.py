@@ -0,0 +1,111 @@
+import time
+from typing import Any, Dict, Set, Union
+
+from ..gateway.rustplus_proto import AppEntityChanged, AppEntityInfo
+from ..rust_models import RustEntityInfo
+
+
+class EntityStore:
+    """
+    Latest known state of entities, fed by get_entity_info responses and
+    entity_changed broadcasts. A broadcast only carries the payload, so an
+    entity can be served once its type is known from one network fetch
+    """
+
+    # While subscribed the server pushes every change, so a quiet entity is
+    # still up to date. The bound only guards against missed broadcasts
+    MAX_AGE = 300
+
+    def __init__(self, max_age: Union[float, None] = None) -> None:
+        self.max_age: float = self.MAX_AGE if max_age is None else max_age
+        self._entities: Dict[int, AppEntityInfo] = {}
+        self._updated: Dict[int, float] = {}
+        # Entities the server has pushed a broadcast for on this connection
+        self._broadcasting: Set[int] = set()
+
+        self._last_sweep: float = time.monotonic()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.broadcasts: int = 0
+
+    def tracks(self, entity_id: int) -> bool:
+        return entity_id in self._entities
+
+    def update_info(self, entity_id: int, info: AppEntityInfo) -> None:
+        self._entities[entity_id] = info
+        self._updated[entity_id] = now = time.monotonic()
+
+        # Entities fetched once and never read again would otherwise stay forever
+        if now - self._last_sweep > self.max_age:
+            self._last_sweep = now
+            self.evict(now)
+
+    def evict(self, now: Union[float, None] = None) -> int:
+        """
+        Drops entities not updated within max_age seconds
+        """
+        now = time.monotonic() if now is None else now
+        expired = [entity_id for entity_id, updated in self._updated.items() if now - updated > self.max_age]
+        for entity_id in expired:
+            self.forget(entity_id)
+        self.evictions += len(expired)
+        return len(expired)
+
+    def update_from_broadcast(self, entity_changed: AppEntityChanged) -> None:
+        entity_id = entity_changed.entity_id
+        self.broadcasts += 1
+        self._broadcasting.add(entity_id)
+
+        info = self._entities.get(entity_id)
+        if info is None:
+            return
+
+        self._entities[entity_id] = AppEntityInfo(type=info.type, payload=entity_changed.payload)
+        self._updated[entity_id] = time.monotonic()
+
+    def get(self, entity_id: int, subscribed: bool = False, max_age: Union[float, None] = None) -> Union[RustEntityInfo, None]:
+        """
+        Returns the stored state if it can be trusted: the entity is subscribed
+        (or broadcasting) and was updated within max_age seconds
+        """
+        info = self._entities.get(entity_id)
+        age = time.monotonic() - self._updated[entity_id] if info is not None else 0
+
+        if info is not None and age > self.max_age:
+            self.forget(entity_id)
+            self.evictions += 1
+            info = None
+
+        if (
+            info is None
+            or not (subscribed or entity_id in self._broadcasting)
+            or age > (self.max_age if max_age is None else max_age)
+        ):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return RustEntityInfo(info)
+
+    def forget(self, entity_id: int) -> None:
+        self._entities.pop(entity_id, None)
+        self._updated.pop(entity_id, None)
+        self._broadcasting.discard(entity_id)
+
+    def clear(self) -> None:
+        # Broadcasts may have been missed while the connection was down
+        self._entities.clear()
+        self._updated.clear()
+        self._broadcasting.clear()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entities": len(self._entities),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "broadcasts": self.broadcasts,
+        }
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Set, Tuple, Union
+
+from ..rust_models import RustError, RustMarker
+
+
+class MarkerDiff:
+    def __init__(
+            self,
+            markers: Dict[int, RustMarker],
+            added: List[RustMarker],
+            removed: List[RustMarker],
+            changed: List[Tuple[RustMarker, RustMarker]],
+            first: bool = False,
+    ) -> None:
+        self.markers = markers
+        self.added = added
+        self.removed = removed
+        # (previous, current) pairs of markers that moved or changed state
+        self.changed = changed
+        # The first diff a watcher receives holds every current marker as added
+        self.first = first
+        self._by_type: Union[Dict[int, List[RustMarker]], None] = None
+
+    def by_type(self, marker_type: int) -> List[RustMarker]:
+        if self._by_type is None:
+            self._by_type = defaultdict(list)
+            for marker in self.markers.values():
+                self._by_type[marker.type].append(marker)
+        return self._by_type.get(marker_type, [])
+
+    @property
+    def changed_types(self) -> Set[int]:
+        return (
+            {marker.type for marker in self.added}
+            | {marker.type for marker in self.removed}
+            | {current.type for _, current in self.changed}
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        return "MarkerDiff[markers={}, added={}, removed={}, changed={}, first={}]".format(
+            len(self.markers), len(self.added), len(self.removed), len(self.changed), self.first
+        )
+
+
+class MarkerWatcher:
+    """
+    Polls the map markers once for any number of watchers and hands each of
+    them the differences to the previous poll. Polling runs only while
+    somebody is watching, at a fixed rate that follows what is on the map
+    """
+
+    INTERVAL = 3
+    # While something fast is on the map (see activity)
+    FAST_INTERVAL = 1
+    # Once nothing has changed for IDLE_AFTER seconds
+    IDLE_INTERVAL = 10
+    IDLE_AFTER = 60
+    # Below this share of rate limit tokens the interval is stretched
+    LOW_TOKENS = 0.25
+    # Doubles with every failed poll in a row, up to IDLE_INTERVAL, so an outage
+    # such as a reconnect does not spend a token every second
+    ERROR_DELAY = 1
+    # Patrol helicopter and CH47
+    FAST_TYPES = {8, 4}
+    POLL_COST = 1
+    RATE_WINDOW = 60
+    # Distance a marker has to cover since it was last reported to count as moved
+    MOVE_THRESHOLD = 5
+
+    def __init__(
+            self,
+            fetch: Callable[[], Awaitable[Union[List[RustMarker], RustError]]],
+            is_open: Callable[[], bool],
+            interval: Union[float, None] = None,
+            move_threshold: Union[float, Dict[int, float], None] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.is_open = is_open
+        self.interval: float = interval or self.INTERVAL
+        self.move_threshold: Union[float, Dict[int, float]] = (
+            self.MOVE_THRESHOLD if move_threshold is None else move_threshold
+        )
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+
+        self.watchers: Set[asyncio.Queue] = set()
+        self.task: Union[asyncio.Task, None] = None
+        self.markers: Union[Dict[int, RustMarker], None] = None
+        # Markers as last reported, so slow movement adds up to a move
+        self._reported: Dict[int, RustMarker] = {}
+
+        # Whether markers need fast polling, e.g. cargo closing in on a harbor
+        self.activity: Callable[[Dict[int, RustMarker]], bool] = self.default_activity
+        # Share of rate limit tokens currently available, between 0 and 1
+        self.budget: Union[Callable[[], float], None] = None
+
+        self.mode: str = "normal"
+        self.last_change: float = time.monotonic()
+        # When each get_markers was issued, failed ones included as they spend tokens too
+        self.poll_times: Deque[float] = deque()
+        self.issued: int = 0
+        self.polls: int = 0
+        self.errors: int = 0
+        self.failures: int = 0
+
+    async def watch(self) -> AsyncIterator[MarkerDiff]:
+        queue: asyncio.Queue = asyncio.Queue()
+        if self.markers is not None:
+            queue.put_nowait(MarkerDiff(self.markers, list(self.markers.values()), [], [], first=True))
+
+        self.watchers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._poll(), name="[RustWPlus.py] Marker Watcher Task")
+
+        try:
+            while True:
+                diff = await queue.get()
+                if diff is None:
+                    return
+                yield diff
+        finally:
+            self.watchers.discard(queue)
+            if not self.watchers and self.task is not None:
+                self.task.cancel()
+                self.task = None
+
+    def _threshold(self, marker_type: int) -> float:
+        if isinstance(self.move_threshold, dict):
+            return self.move_threshold.get(marker_type, self.MOVE_THRESHOLD)
+        return self.move_threshold
+
+    @staticmethod
+    def _state(marker: RustMarker) -> Tuple:
+        return (
+            marker.name,
+            marker.out_of_stock,
+            marker.radius,
+            tuple(
+                (order.item_id, order.quantity, order.currency_id, order.cost_per_item, order.amount_in_stock)
+                for order in marker.sell_orders
+            ),
+        )
+
+    def diff(self, markers: List[RustMarker]) -> MarkerDiff:
+        current = {marker.id: marker for marker in markers}
+        first = self.markers is None
+        added, changed = [], []
+
+        for marker_id, marker in current.items():
+            previous = self._reported.get(marker_id)
+            if previous is None:
+                added.append(marker)
+                self._reported[marker_id] = marker
+            elif (
+                math.hypot(marker.x - previous.x, marker.y - previous.y) >= self._threshold(marker.type)
+                or self._state(marker) != self._state(previous)
+            ):
+                changed.append((previous, marker))
+                self._reported[marker_id] = marker
+
+        removed = [marker for marker_id, marker in self._reported.items() if marker_id not in current]
+        for marker in removed:
+            del self._reported[marker.id]
+
+        self.markers = current
+        return MarkerDiff(current, added, removed, changed, first=first)
+
+    def publish(self, diff: Union[MarkerDiff, None]) -> None:
+        for queue in self.watchers:
+            queue.put_nowait(diff)
+
+    def default_activity(self, markers: Dict[int, RustMarker]) -> bool:
+        return any(marker.type in self.FAST_TYPES for marker in markers.values())
+
+    def next_interval(self, markers: Dict[int, RustMarker]) -> float:
+        if self.activity(markers):
+            self.mode, interval = "fast", self.FAST_INTERVAL
+        elif time.monotonic() - self.last_change >= self.IDLE_AFTER:
+            self.mode, interval = "idle", self.IDLE_INTERVAL
+        else:
+            self.mode, interval = "normal", self.interval
+
+        if self.budget is not None:
+            available = self.budget()
+            if available < self.LOW_TOKENS:
+                # Scales up to 4x as the bucket runs dry, leaving the tokens to others
+                self.mode = "throttled"
+                interval *= 1 + 3 * (1 - available / self.LOW_TOKENS)
+
+        return interval
+
+    async def _poll(self) -> None:
+        due = time.monotonic()
+        try:
+            while self.is_open():
+                now = time.monotonic()
+                self.issued += 1
+                self.poll_times.append(now)
+                while self.poll_times[0] < now - self.RATE_WINDOW:
+                    self.poll_times.popleft()
+
+                markers = await self.fetch()
+                if isinstance(markers, RustError):
+                    self.errors += 1
+                    self.failures += 1
+                    self.mode = "backoff"
+                    delay = min(self.ERROR_DELAY * 2 ** (self.failures - 1), self.IDLE_INTERVAL)
+                    self.logger.warning(f"Marker poll failed, retrying in {delay}s: {markers}")
+                    await asyncio.sleep(delay)
+                    due = time.monotonic()
+                    continue
+
+                self.failures = 0
+
+                now = time.monotonic()
+                self.polls += 1
+
+                diff = self.diff(markers)
+                if diff:
+                    self.last_change = now
+                if diff or diff.first:
+                    self.publish(diff)
+
+                # Fixed rate, so time spent polling and in watchers does not stretch
+                # the period. Ticks missed while falling behind are skipped
+                due += self.next_interval(self.markers)
+                now = time.monotonic()
+                if due < now:
+                    due = now
+                await asyncio.sleep(due - now)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.exception(f"Marker watcher crashed: {e}")
+
+        self.publish(None)
+
+    @property
+    def poll_rate(self) -> float:
+        """
+        Polls per second issued over the last RATE_WINDOW seconds
+        """
+        if len(self.poll_times) < 2:
+            return 0.0
+        return (len(self.poll_times) - 1) / (self.poll_times[-1] - self.poll_times[0])
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watchers": len(self.watchers),
+            "markers": len(self.markers) if self.markers is not None else 0,
+            "issued": self.issued,
+            "polls": self.polls,
+            "errors": self.errors,
+            "mode": self.mode,
+            "poll_rate": self.poll_rate,
+            "tokens_per_minute": self.poll_rate * self.POLL_COST * 60,
+            "tokens_spent": self.issued * self.POLL_COST,
+        }
@@ -0,0 +1,116 @@
+import math
+import time
+from typing import Any, Dict, List, Union
+
+from ..rust_models import RustTeamInfo, RustTeamMember
+
+
+class TeamChange:
+    JOINED = "joined"
+    LEFT = "left"
+    ONLINE = "online"
+    OFFLINE = "offline"
+    DIED = "died"
+    RESPAWNED = "respawned"
+    MOVED = "moved"
+
+    def __init__(
+            self,
+            kind: str,
+            steam_id: int,
+            name: str,
+            before: Union[RustTeamMember, None] = None,
+            after: Union[RustTeamMember, None] = None,
+    ) -> None:
+        self.kind = kind
+        self.steam_id = steam_id
+        self.name = name
+        self.before = before
+        self.after = after
+
+    def __str__(self) -> str:
+        return f"TeamChange[kind={self.kind}, steam_id={self.steam_id}, name={self.name}]"
+
+
+class TeamMirror:
+    """
+    Latest team snapshot, taken from team_changed broadcasts and get_team_info
+    responses, and the differences between consecutive snapshots
+    """
+
+    # Broadcasts are not sent for every step a member takes, so positions in
+    # the snapshot drift. Callers needing exact positions pass max_age=0
+    MAX_AGE = 30
+    # Distance a member has to cover to be reported as moved
+    MOVE_THRESHOLD = 5
+
+    def __init__(self, max_age: Union[float, None] = None, move_threshold: Union[float, None] = None) -> None:
+        self.max_age: float = self.MAX_AGE if max_age is None else max_age
+        self.move_threshold: float = self.MOVE_THRESHOLD if move_threshold is None else move_threshold
+        self.team_info: Union[RustTeamInfo, None] = None
+        self.updated: float = -math.inf
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.broadcasts: int = 0
+
+    def get(self, max_age: Union[float, None] = None) -> Union[RustTeamInfo, None]:
+        max_age = self.max_age if max_age is None else max_age
+        if self.team_info is None or time.monotonic() - self.updated > max_age:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self.team_info
+
+    def update(self, team_info: RustTeamInfo, broadcast: bool = False) -> List[TeamChange]:
+        changes = self.diff(self.team_info, team_info) if self.team_info is not None else []
+        self.team_info = team_info
+        self.updated = time.monotonic()
+        if broadcast:
+            self.broadcasts += 1
+        return changes
+
+    def invalidate(self) -> None:
+        # Keeps the snapshot to diff the next one against, but stops serving it
+        self.updated = -math.inf
+
+    def diff(self, old: RustTeamInfo, new: RustTeamInfo) -> List[TeamChange]:
+        before = {member.steam_id: member for member in old.members}
+        after = {member.steam_id: member for member in new.members}
+        changes = []
+
+        for steam_id, member in after.items():
+            previous = before.get(steam_id)
+            if previous is None:
+                changes.append(TeamChange(TeamChange.JOINED, steam_id, member.name, None, member))
+                continue
+
+            if previous.is_online != member.is_online:
+                kind = TeamChange.ONLINE if member.is_online else TeamChange.OFFLINE
+                changes.append(TeamChange(kind, steam_id, member.name, previous, member))
+
+            if previous.is_alive != member.is_alive:
+                kind = TeamChange.RESPAWNED if member.is_alive else TeamChange.DIED
+                changes.append(TeamChange(kind, steam_id, member.name, previous, member))
+            elif (
+                member.is_alive
+                and math.hypot(member.x - previous.x, member.y - previous.y) >= self.move_threshold
+            ):
+                changes.append(TeamChange(TeamChange.MOVED, steam_id, member.name, previous, member))
+
+        for steam_id, member in before.items():
+            if steam_id not in after:
+                changes.append(TeamChange(TeamChange.LEFT, steam_id, member.name, member, None))
+
+        return changes
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "members": len(self.team_info.members) if self.team_info is not None else 0,
+            "age": time.monotonic() - self.updated if self.team_info is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "broadcasts": self.broadcasts,
+        }
@@ -11,4 +11,10 @@ from .utils import (
     format_time_simple
 )
 from .yielding_event import YieldingEvent
-from .emojis import Emoji
\ No newline at end of file
+from .emojis import Emoji
+from .single_flight import SingleFlight
+from .response_cache import ResponseCache
+from .map_cache import MapCache
+from .map_renderer import MapRenderer
+from .icon_registry import IconRegistry, icons
+from .grid_cache import GridCache, grids
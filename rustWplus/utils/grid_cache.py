@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple, Union
+
+from PIL import Image
+
+from .utils import generate_grid
+from ..constants import GRID_CACHE_DIR, data_path
+
+
+class GridCache:
+    """
+    Grid overlays keyed by map size and label style, persisted as PNG so they survive restarts
+    """
+
+    # A 4000 sized overlay is about 64MB decoded, so only a few stay in memory
+    MAX_ENTRIES = 2
+
+    def __init__(self, directory: Union[str, None] = None, max_entries: Union[int, None] = None) -> None:
+        self._directory: Union[str, None] = directory
+        self.max_entries: int = max_entries or self.MAX_ENTRIES
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, int, int, str], Image.Image]" = OrderedDict()
+
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def directory(self) -> str:
+        # Resolved on use, as the module level instance exists before set_data_dir can be called
+        return self._directory or data_path(GRID_CACHE_DIR)
+
+    def path(self, map_size: int, text_size: int, text_padding: int, color: str) -> str:
+        color = "".join(c if c.isalnum() else "_" for c in color)
+        return os.path.join(self.directory, f"grid_{map_size}_{text_size}_{text_padding}_{color}.png")
+
+    def get(self, map_size: int, text_size: int = 20, text_padding: int = 5, color: str = "black") -> Image.Image:
+        key = (map_size, text_size, text_padding, color)
+
+        # Held while drawing, so concurrent renders wait for one grid instead of each drawing it
+        with self._lock:
+            grid = self._entries.get(key)
+            if grid is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return grid
+
+            grid = self._load(*key)
+            if grid is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                grid = generate_grid(map_size, text_size, text_padding, color)
+                self._save(grid, *key)
+
+            self._entries[key] = grid
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return grid
+
+    def _load(self, *key) -> Union[Image.Image, None]:
+        try:
+            with Image.open(self.path(*key)) as image:
+                return image.convert("RGBA")
+        except OSError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable cached grid: {e}")
+            return None
+
+    def _save(self, grid: Image.Image, *key) -> None:
+        path = self.path(*key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            grid.save(path + ".tmp", format="PNG")
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self.logger.warning(f"Failed to cache grid: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+grids = GridCache()
@@ -0,0 +1,176 @@
+import logging
+import threading
+from collections import OrderedDict
+from importlib import resources
+from typing import Any, Dict, Set, Tuple, Union
+
+from PIL import Image
+
+ICONS_PATH = "rustWplus.resources.icons"
+
+MONUMENT_ICONS = {
+    "supermarket": "supermarket.png",
+    "mining_outpost_display_name": "mining_outpost.png",
+    "gas_station": "oxums.png",
+    "fishing_village_display_name": "fishing.png",
+    "large_fishing_village_display_name": "fishing.png",
+    "lighthouse_display_name": "lighthouse.png",
+    "excavator": "excavator.png",
+    "water_treatment_plant_display_name": "water_treatment.png",
+    "train_yard_display_name": "train_yard.png",
+    "outpost": "outpost.png",
+    "bandit_camp": "bandit.png",
+    "jungle_ziggurat": "jungle_ziggurat.png",
+    "junkyard_display_name": "junkyard.png",
+    "dome_monument_name": "dome.png",
+    "satellite_dish_display_name": "satellite.png",
+    "power_plant_display_name": "power_plant.png",
+    "military_tunnels_display_name": "military_tunnels.png",
+    "airfield_display_name": "airfield.png",
+    "launchsite": "launchsite.png",
+    "sewer_display_name": "sewer.png",
+    "oil_rig_small": "small_oil_rig.png",
+    "large_oil_rig": "large_oil_rig.png",
+    "underwater_lab": "underwater_lab.png",
+    "AbandonedMilitaryBase": "desert_base.png",
+    "ferryterminal": "ferryterminal.png",
+    "harbor_display_name": "harbour.png",
+    "harbor_2_display_name": "harbour.png",
+    "arctic_base_a": "arctic_base.png",
+    "arctic_base_b": "arctic_base.png",
+    "missile_silo_monument": "missile_silo.png",
+    "stables_a": "stables.png",
+    "stables_b": "stables.png",
+    "mining_quarry_stone_display_name": "mining_quarry_stone.png",
+    "mining_quarry_sulfur_display_name": "mining_quarry_sulfur.png",
+    "mining_quarry_hqm_display_name": "mining_quarry_hqm.png",
+    "train_tunnel_link_display_name": "train.png",
+    "train_tunnel_display_name": "train.png",
+    "radtown": "radtown.png",
+}
+
+# Marker type -> icon file and the size it is drawn at
+MARKER_ICONS = {
+    2: ("explosion.png", (96, 96)),
+    4: ("chinook.png", None),
+    5: ("cargo.png", None),
+    6: ("crate.png", (85, 85)),
+    8: ("patrol.png", (200, 200)),
+}
+
+
+class IconRegistry:
+    """
+    Map icons decoded and resized once per process. Rotated marker icons are
+    kept per angle bucket in an LRU. Safe to use from the map renderer's
+    worker threads; the returned images are shared and must not be modified
+    """
+
+    # Marker rotations are rounded to this many degrees
+    ANGLE_STEP = 5
+    MAX_ROTATED = 256
+
+    def __init__(self, angle_step: Union[float, None] = None, max_rotated: Union[int, None] = None) -> None:
+        self.angle_step: float = angle_step or self.ANGLE_STEP
+        self.max_rotated: int = max_rotated or self.MAX_ROTATED
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+
+        self._lock = threading.RLock()
+        self._files: Dict[Tuple[str, Union[Tuple[int, int], None]], Image.Image] = {}
+        self._markers: Dict[int, Image.Image] = {}
+        self._rotated: "OrderedDict[Tuple[int, float], Image.Image]" = OrderedDict()
+        self._unknown: Set[str] = set()
+
+        self.loads: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def load(self, file_name: str, size: Union[Tuple[int, int], None] = None) -> Image.Image:
+        key = (file_name, size)
+        with self._lock:
+            icon = self._files.get(key)
+            if icon is None:
+                if size is not None:
+                    icon = self.load(file_name).resize(size)
+                else:
+                    with resources.path(ICONS_PATH, file_name) as path:
+                        icon = Image.open(path).convert("RGBA")
+                    self.loads += 1
+                self._files[key] = icon
+            return icon
+
+    def monument(self, name: str, size: Union[Tuple[int, int], None] = None) -> Image.Image:
+        if name in MONUMENT_ICONS:
+            return self.load(MONUMENT_ICONS[name], size)
+        if "swamp" in name:
+            return self.load("swamp.png", size)
+
+        with self._lock:
+            if name not in self._unknown:
+                self._unknown.add(name)
+                self.logger.info(f"{name} - Has no icon, report this as an issue")
+        return self.load("icon.png", size)
+
+    def _marker(self, marker_type: int) -> Image.Image:
+        icon = self._markers.get(marker_type)
+        if icon is not None:
+            return icon
+
+        file_name, size = MARKER_ICONS[marker_type]
+        icon = self.load(file_name, size)
+
+        if marker_type == 4:
+            icon = icon.copy()
+            blades = self.load("chinook_blades.png", (100, 100))
+            icon.paste(blades, (64 - 50, 96 - 50), blades)
+            icon.paste(blades, (64 - 50, 32 - 50), blades)
+        elif marker_type == 8:
+            icon = icon.copy()
+            blades = self.load("chinook_blades.png", (200, 200))
+            icon.paste(blades, (0, 0), blades)
+
+        self._markers[marker_type] = icon
+        return icon
+
+    def marker(self, marker_type: int, angle: float = 0) -> Image.Image:
+        bucket = round(angle / self.angle_step) * self.angle_step % 360
+        key = (marker_type, bucket)
+
+        with self._lock:
+            icon = self._rotated.get(key)
+            if icon is not None:
+                self._rotated.move_to_end(key)
+                self.hits += 1
+                return icon
+
+            self.misses += 1
+            icon = self._marker(marker_type)
+            if bucket:
+                icon = icon.rotate(bucket)
+
+            self._rotated[key] = icon
+            if len(self._rotated) > self.max_rotated:
+                self._rotated.popitem(last=False)
+                self.evictions += 1
+            return icon
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files.clear()
+            self._markers.clear()
+            self._rotated.clear()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self._files),
+            "rotated": len(self._rotated),
+            "loads": self.loads,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+icons = IconRegistry()
@@ -0,0 +1,75 @@
+import logging
+import os
+from typing import Any, Dict, Union
+
+from ..constants import MAP_CACHE_DIR, data_path
+from ..gateway.rustplus_proto import AppMap
+from ..identification import RustServer
+from ..rust_models import RustServerInfo
+
+
+class MapCache:
+    """
+    Keeps the map (JPEG and monuments) of each server on disk. The map only
+    changes at a wipe, so entries are keyed by server, seed, map size and wipe
+    time as reported by get_info, and older entries of a server are removed
+    once a new one is stored
+    """
+
+    def __init__(self, directory: Union[str, None] = None) -> None:
+        self._directory: Union[str, None] = directory
+        self.logger: logging.Logger = logging.getLogger("rustWplus.py")
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def directory(self) -> str:
+        return self._directory or data_path(MAP_CACHE_DIR)
+
+    @staticmethod
+    def _prefix(server_details: RustServer) -> str:
+        return server_details.get_server_string().replace(":", "_").replace("/", "_") + "_"
+
+    def path(self, server_details: RustServer, server_info: RustServerInfo) -> str:
+        name = f"{self._prefix(server_details)}{server_info.seed}_{server_info.map_size}_{server_info.wipe_time}.map"
+        return os.path.join(self.directory, name)
+
+    def load(self, server_details: RustServer, server_info: RustServerInfo) -> Union[AppMap, None]:
+        try:
+            with open(self.path(server_details, server_info), "rb") as f:
+                app_map = AppMap().parse(f.read())
+        except OSError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable cached map: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return app_map
+
+    def save(self, server_details: RustServer, server_info: RustServerInfo, app_map: AppMap) -> None:
+        path = self.path(server_details, server_info)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(bytes(app_map))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self.logger.warning(f"Failed to cache map: {e}")
+            return
+
+        # Maps of previous wipes are never valid again
+        prefix = self._prefix(server_details)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(".map") and os.path.join(self.directory, name) != path:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Tuple, Union
+
+from PIL import Image
+
+from .icon_registry import icons
+from .grid_cache import grids
+from .utils import format_coords
+from ..gateway.rustplus_proto import AppMap
+from ..rust_models import RustMarker
+
+
+def render_map(
+        app_map: AppMap,
+        map_size: int,
+        markers: List[RustMarker],
+        avatars: List[Tuple[Image.Image, Tuple[int, int]]],
+        add_icons: bool = False,
+        add_events: bool = False,
+        add_vending_machines: bool = False,
+        add_extra_images: Union[Dict[str, Image.Image], None] = None,
+        show_grid: bool = False,
+) -> Image.Image:
+    """
+    Draws the map image. CPU bound and blocking, meant to run in a worker thread
+    """
+    if add_extra_images is None:
+        add_extra_images = {}
+
+    output = Image.open(BytesIO(app_map.jpg_image))
+
+    output = output.crop(
+        (500, 500, app_map.height - 500, app_map.width - 500)
+    )
+
+    output = output.resize((map_size, map_size), Image.LANCZOS).convert("RGBA")
+
+    if show_grid:
+        output.paste(grid := grids.get(map_size), (5, 5), grid)
+
+    if add_icons:
+        for monument in app_map.monuments:
+            if str(monument.token) == "DungeonBase":
+                continue
+            # Overrides belong to this call, they are resized but never cached
+            if monument.token in add_extra_images:
+                icon = add_extra_images[monument.token].resize((150, 150))
+            elif str(monument.token) == "train_tunnel_display_name":
+                icon = icons.monument(str(monument.token), (100, 125))
+            else:
+                icon = icons.monument(str(monument.token))
+
+            output.paste(
+                icon,
+                (format_coords(x = int(monument.x), y = int(monument.y), map_size=map_size)),
+                icon
+            )
+
+    if add_vending_machines:
+        vending_machine = icons.load("vending_machine.png", (100, 100))
+
+    for marker in markers:
+        if add_events:
+            if marker.type in [2, 4, 5, 6, 8]:
+                icon = icons.marker(int(marker.type), marker.rotation)
+                if marker.type == 6:
+                    x, y = marker.x, marker.y
+                    y = min(max(y, 0), map_size)
+                    x = min(max(x, 0), map_size - 75 if x > map_size else x)
+                    output.paste(icon, (int(x), map_size - int(y)), icon)
+                else:
+                    output.paste(
+                        icon,
+                        (format_coords(int(marker.x), int(marker.y), map_size)),
+                        icon
+                    )
+
+        if add_vending_machines and marker.type == 3:
+            output.paste(
+                vending_machine,
+                (int(marker.x) - 50, map_size - int(marker.y) - 50),
+                vending_machine
+            )
+
+    for avatar, position in avatars:
+        output.paste(avatar, position, avatar)
+
+    return output
+
+
+class MapRenderer:
+    """
+    Runs render_map in a thread pool so the event loop keeps serving frames
+    while a map is drawn. At most max_concurrent renders run at a time, the
+    rest wait their turn
+    """
+
+    WORKERS = 2
+    MAX_CONCURRENT = 2
+
+    def __init__(self, workers: Union[int, None] = None, max_concurrent: Union[int, None] = None) -> None:
+        self.workers: int = workers or self.WORKERS
+        self.max_concurrent: int = max_concurrent or self.MAX_CONCURRENT
+        self.executor: Union[ThreadPoolExecutor, None] = None
+        self._slots: Union[asyncio.Semaphore, None] = None
+
+        self.waiting: int = 0
+        self.active: int = 0
+        self.rendered: int = 0
+        self.total_time: float = 0
+
+    async def render(self, *args, **kwargs) -> Image.Image:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="rustWplus-map")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, lambda: render_map(*args, **kwargs)
+            )
+        finally:
+            self.active -= 1
+            self.rendered += 1
+            self.total_time += time.monotonic() - started
+            self._slots.release()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "active": self.active,
+            "rendered": self.rendered,
+            "avg_time": self.total_time / self.rendered if self.rendered else 0.0,
+        }
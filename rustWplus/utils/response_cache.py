@@ -0,0 +1,110 @@
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Tuple, Union
+
+
+class ResponseCache:
+    """
+    In-memory TTL cache for RustSocket read methods, bounded by an estimated
+    size in bytes and evicted least recently used first
+    """
+
+    # Seconds an entry stays valid, 0 disables caching for that method
+    DEFAULT_TTLS = {
+        "get_info": 10,
+        "get_time": 0,
+        "get_team_info": 0,
+        "get_markers": 0,
+        "get_map": 6 * 60 * 60,
+    }
+    # Entries that only change when the server wipes
+    WIPE_SENSITIVE = {"get_map"}
+    MAX_BYTES = 64 * 1024 * 1024
+    DEFAULT_SIZE = 1024
+
+    def __init__(self, ttls: Union[Dict[str, float], None] = None, max_bytes: Union[int, None] = None) -> None:
+        self.ttls: Dict[str, float] = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes: int = max_bytes or self.MAX_BYTES
+
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes: int = 0
+        self._wipe: Union[Tuple[int, int], None] = None
+
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self.evictions: int = 0
+        self.wipes: int = 0
+
+    def enabled(self, method: str) -> bool:
+        return self.ttls.get(method, 0) > 0
+
+    def get(self, method: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(method)
+
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                self._remove(method)
+            self.misses[method] += 1
+            return False, None
+
+        self._entries.move_to_end(method)
+        self.hits[method] += 1
+        return True, entry[0]
+
+    def set(self, method: str, value: Any, size: Union[int, None] = None) -> None:
+        ttl = self.ttls.get(method, 0)
+        if ttl <= 0:
+            return
+
+        size = size or self.DEFAULT_SIZE
+        if size > self.max_bytes:
+            return
+
+        self._remove(method)
+        self._entries[method] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, method: Union[str, None] = None) -> None:
+        if method is None:
+            self._entries.clear()
+            self._bytes = 0
+            return
+
+        self._remove(method)
+
+    def observe_server(self, wipe_time: int, seed: int) -> bool:
+        """
+        Records the wipe time and seed reported by get_info and drops every wipe
+        sensitive entry when they change. Returns True when a wipe was detected
+        """
+        wipe = (wipe_time, seed)
+        wiped = self._wipe is not None and self._wipe != wipe
+        self._wipe = wipe
+
+        if wiped:
+            self.wipes += 1
+            for method in self.WIPE_SENSITIVE:
+                self._remove(method)
+
+        return wiped
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "wipes": self.wipes,
+        }
+
+    def _remove(self, method: Hashable) -> None:
+        entry = self._entries.pop(method, None)
+        if entry is not None:
+            self._bytes -= entry[2]
@@ -0,0 +1,48 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call is
+    in flight wait for it and get the same result instead of issuing their own
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.saved: Dict[Hashable, int] = defaultdict(int)
+        self.tokens_saved: int = 0
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], cost: int = 0) -> Any:
+        task = self._calls.get(key)
+
+        if task is None:
+            # A separate task, so one caller being cancelled does not cancel it for everyone
+            task = asyncio.ensure_future(fetch())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.saved[key] += 1
+            self.tokens_saved += cost
+
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "saved_requests": sum(self.saved.values()),
+            "saved_tokens": self.tokens_saved,
+            "by_key": dict(self.saved),
+        }
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+        if not task.cancelled():
+            # Marks the exception as retrieved when every waiter was cancelled
+            task.exception()
@@ -1,18 +1,22 @@
-import logging
+import asyncio
 import string
 from importlib import resources
 from typing import Tuple, Dict
 from ..rust_models import RustTime
 from .emojis import Emoji
+from .icon_registry import icons
 
 import requests
 from PIL import ImageFont, Image, ImageDraw
 
-ICONS_PATH = "rustWplus.resources.icons"
 FONT_PATH = "rustWplus.resources.fonts"
 GRID_DIAMETER = 146.28571428571428
 PLAYER_MARKER_ONLINE_COLOR = (201, 242, 155, 255)
 PLAYER_MARKER_OFFLINE_COLOR = (128, 128, 128, 255)
+# Grid column names, A to Z then AA to ZZ
+GRID_LABELS = tuple(string.ascii_uppercase) + tuple(
+    a + b for a in string.ascii_uppercase for b in string.ascii_uppercase
+)
 
 def error_present(app_message) -> bool:
 
@@ -82,11 +86,6 @@ def generate_grid(map_size: int, text_size: int = 20, text_padding: int = 5, col
     with resources.path(FONT_PATH, "PermanentMarker.ttf") as path:
         font = ImageFont.truetype(str(path), text_size)
 
-    letters = list(string.ascii_uppercase)
-    letters.extend(
-        a+b for a in string.ascii_uppercase for b in string.ascii_uppercase
-    )
-
     num_cells = int(map_size / GRID_DIAMETER)
 
     for col in range(num_cells):
@@ -95,20 +94,15 @@ def generate_grid(map_size: int, text_size: int = 20, text_padding: int = 5, col
             end = ( (col + 1) * GRID_DIAMETER, (row + 1) * GRID_DIAMETER)
             d.rectangle(xy=(start, end), outline=color) 
 
-            text = letters[col] + str(row)
+            text = GRID_LABELS[col] + str(row)
             text_pos = (start[0] + text_padding, start[1] + text_padding)
             d.text(text_pos, text, fill=color, font=font)
-    
-    img.show()
 
     return img
 
 
 def convert_coordinates_to_grid(coords: Tuple[int, int], map_size: int) -> Tuple[str, int]:
-    grids = list(string.ascii_uppercase)
-    grids.extend(a+b for a in string.ascii_uppercase for b in string.ascii_uppercase)
-
-    return grids[int(coords[0] // GRID_DIAMETER)], int ((map_size - coords[1]) // GRID_DIAMETER)
+    return GRID_LABELS[int(coords[0] // GRID_DIAMETER)], int ((map_size - coords[1]) // GRID_DIAMETER)
 
 
 def format_coords(x: int, y: int, map_size: int) -> Tuple[int, int]:
@@ -118,8 +112,8 @@ def format_coords(x: int, y: int, map_size: int) -> Tuple[int, int]:
 
     return x,y
 
-async def fetch_avatar_icon(steam_id: int, online: bool) -> Image.Image:
-    avatar = (
+def _download_avatar(steam_id: int) -> Image.Image:
+    return (
         Image.open(
         requests.get(f"https://companion-rust.facepunch.com/api/avatar/{steam_id}", stream=True).raw
     )
@@ -127,6 +121,10 @@ async def fetch_avatar_icon(steam_id: int, online: bool) -> Image.Image:
     .convert("RGBA")
     )
 
+async def fetch_avatar_icon(steam_id: int, online: bool) -> Image.Image:
+    # The download and resize block, keep them off the event loop
+    avatar = await asyncio.to_thread(_download_avatar, steam_id)
+
     return await avatar_processing(avatar, 5, online)
 
 async def avatar_processing(image: Image.Image, border_size: int, player_online: bool = False) -> Image.Image:
@@ -160,97 +158,12 @@ async def avatar_processing(image: Image.Image, border_size: int, player_online:
 
 
 def convert_marker(marker_type: int, angle) -> Image.Image:
-    name_to_file = {
-        2: "explosion.png",
-        4: "chinook.png",
-        5: "cargo.png",
-        6: "crate.png",
-        8: "patrol.png",
-    }
-    with resources.path(ICONS_PATH, name_to_file[marker_type]) as path:
-        icon = Image.open(path).convert("RGBA")
-
-    if marker_type == 6:
-        icon = icon.resize((85, 85))
-    elif marker_type == 2:
-        icon = icon.resize((96, 96))
-    elif marker_type == 4 or marker_type == 8:
-        blades_file = "chinook_blades.png"
-        blades_size = (100, 100) if marker_type == 4 else (200, 200)
-
-        with resources.path(ICONS_PATH, blades_file) as path:
-            blades = Image.open(path).convert("RGBA")
-        blades = blades.resize(blades_size)
-
-        if marker_type == 4:
-            icon.paste(blades, (64 - 50, 96 - 50), blades)
-            icon.paste(blades, (64 - 50, 32 - 50), blades)
-        else:
-            icon = icon.resize((200, 200))
-            icon.paste(blades, (0,0), blades)
-        
-    icon = icon.rotate(angle)
-    return icon
+    return icons.marker(marker_type, angle).copy()
 
 def convert_monument(name: str, override_images: Dict[str, Image.Image]) -> Image.Image:
-    name_to_file = {
-        "supermarket": "supermarket.png",
-        "mining_outpost_display_name": "mining_outpost.png",
-        "gas_station": "oxums.png",
-        "fishing_village_display_name": "fishing.png",
-        "large_fishing_village_display_name": "fishing.png",
-        "lighthouse_display_name": "lighthouse.png",
-        "excavator": "excavator.png",
-        "water_treatment_plant_display_name": "water_treatment.png",
-        "train_yard_display_name": "train_yard.png",
-        "outpost": "outpost.png",
-        "bandit_camp": "bandit.png",
-        "jungle_ziggurat": "jungle_ziggurat.png",
-        "junkyard_display_name": "junkyard.png",
-        "dome_monument_name": "dome.png",
-        "satellite_dish_display_name": "satellite.png",
-        "power_plant_display_name": "power_plant.png",
-        "military_tunnels_display_name": "military_tunnels.png",
-        "airfield_display_name": "airfield.png",
-        "launchsite": "launchsite.png",
-        "sewer_display_name": "sewer.png",
-        "oil_rig_small": "small_oil_rig.png",
-        "large_oil_rig": "large_oil_rig.png",
-        "underwater_lab": "underwater_lab.png",
-        "AbandonedMilitaryBase": "desert_base.png",
-        "ferryterminal": "ferryterminal.png",
-        "harbor_display_name": "harbour.png",
-        "harbor_2_display_name": "harbour.png",
-        "arctic_base_a": "arctic_base.png",
-        "arctic_base_b": "arctic_base.png",
-        "missile_silo_monument": "missile_silo.png",
-        "stables_a": "stables.png",
-        "stables_b": "stables.png",
-        "mining_quarry_stone_display_name": "mining_quarry_stone.png",
-        "mining_quarry_sulfur_display_name": "mining_quarry_sulfur.png",
-        "mining_quarry_hqm_display_name": "mining_quarry_hqm.png",
-        "train_tunnel_link_display_name": "train.png",
-        "train_tunnel_display_name": "train.png",
-        "radtown": "radtown.png",
-    }
-
     try:
         return override_images[name]
     except KeyError:
         pass
 
-    if name in name_to_file:
-        file_name = name_to_file[name]
-        with resources.path(ICONS_PATH, file_name) as path:
-            icon = Image.open(path).convert("RGBA")
-    elif "swamp" in name:
-        with resources.path(ICONS_PATH, "swamp.png") as path:
-            icon = Image.open(path).convert("RGBA")
-    else:
-        logging.getLogger("rustplus.py").info(
-            f"{name} - Has no icon, report this as an issue"
-        )
-        with resources.path(ICONS_PATH, "icon.png") as path:
-            icon = Image.open(path).convert("RGBA")
-
-    return icon
\ No newline at end of file
+    return icons.monument(name).copy()